@@ -0,0 +1,665 @@
+# Benchmarks for Statcast Highlight Tool. Run with: python benchmarks.py [name ...]
+import sys
+import time
+import numpy as np
+import pandas as pd
+import pyb_tools
+
+teams = ['BOS', 'NYY', 'KC', 'CIN', 'WSH', 'TB', 'MIA', 'HOU', 'TEX', 'CHC', 'STL', 'LAD', 'SEA', 'OAK', 'SD',
+         'BAL', 'SF', 'MIN', 'PIT', 'ATL', 'DET', 'NYM', 'CWS', 'PHI', 'MIL', 'TOR', 'AZ', 'CLE', 'LAA', 'COL']
+descriptions = ['ball', 'called_strike', 'foul', 'hit_into_play', 'swinging_strike', 'blocked_ball',
+                'swinging_strike_blocked', 'foul_tip', 'hit_by_pitch']
+events = [None, None, None, 'single', 'double', 'triple', 'home_run', 'strikeout', 'walk', 'field_out']
+
+def synthetic_statcast(n, seed = 0, days = 180, start_date = '2023-03-30'):
+    """Generates a statcast-shaped DataFrame of n pitches with realistic value ranges."""
+    rng = np.random.default_rng(seed)
+    home = rng.integers(0, len(teams), n)
+    away = (home + rng.integers(1, len(teams), n)) % len(teams)
+    df = pd.DataFrame({
+        'game_date': pd.Timestamp(start_date) + pd.to_timedelta(rng.integers(0, days, n), unit = 'D'),
+        'batter': rng.integers(400000, 700000, n),
+        'pitcher': rng.integers(400000, 700000, n),
+        'home_team': np.array(teams, dtype = object)[home],
+        'away_team': np.array(teams, dtype = object)[away],
+        'inning_topbot': np.where(rng.random(n) < 0.5, 'Top', 'Bot').astype(object),
+        'inning': rng.integers(1, 10, n),
+        'balls': rng.integers(0, 4, n),
+        'strikes': rng.integers(0, 3, n),
+        'at_bat_number': rng.integers(1, 80, n),
+        'pitch_number': rng.integers(1, 7, n),
+        'description': np.array(descriptions, dtype = object)[rng.integers(0, len(descriptions), n)],
+        'events': np.array(events, dtype = object)[rng.integers(0, len(events), n)],
+        'plate_x': np.round(rng.normal(0, 0.9, n), 2),
+        'plate_z': np.round(rng.normal(2.4, 0.9, n), 2),
+        'sz_top': np.round(rng.normal(3.4, 0.15, n), 2),
+        'sz_bot': np.round(rng.normal(1.6, 0.1, n), 2),
+        'launch_speed': np.round(rng.normal(88, 14, n), 1),
+        'launch_angle': np.round(rng.normal(12, 25, n)),
+        'hit_distance_sc': np.round(rng.normal(180, 110, n)),
+        'delta_home_win_exp': np.round(rng.normal(0, 0.03, n), 3),
+    })
+    # Statcast leaves tracking fields empty on a small share of pitches
+    for col in ['plate_x', 'plate_z', 'sz_top', 'sz_bot']:
+        df.loc[rng.random(n) < 0.005, col] = np.nan
+    return df
+
+def timed(func, *args, repeat = 1, **kwargs):
+    """Returns the best wall time in seconds over repeat calls, plus the last return value."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def legacy_kzone_miss(df):
+    """The original row-wise apply implementation of pyb_tools.kzone_miss."""
+    correction = 0
+
+    def ft_high_or_low(x):
+        sz_top, sz_bot, plate_z = x
+        if (plate_z > sz_bot - correction) and (plate_z < sz_top + correction):
+            return 0
+        return min(abs(sz_bot - plate_z + correction), abs(plate_z - sz_top - correction))
+
+    def off_edge(x):
+        if (x > -0.75) and (x < 0.75):
+            return 0
+        else:
+            return abs(x) - 0.75
+
+    def miss_by(x):
+        a, b = x
+        return round(((a * a) + (b * b)) ** 0.5, ndigits = 2)
+
+    df = df.dropna(subset = ['sz_top', 'sz_bot', 'plate_z', 'plate_x'])
+    df['high_low'] = df[['sz_top', 'sz_bot', 'plate_z']].apply(ft_high_or_low, axis = 1)
+    df['off_edge'] = df['plate_x'].apply(off_edge)
+    df['miss_by'] = df[['high_low', 'off_edge']].apply(miss_by, axis = 1)
+    return df
+
+def legacy_off_center(df):
+    """The original row-wise apply implementation of pyb_tools.off_center."""
+    def calc_off_center(x):
+        plate_x, plate_z, sz_top, sz_bot = x
+        a = plate_x
+        b = plate_z - ((sz_top + sz_bot)/2)
+        c = (a * a) + (b * b)
+        return c ** 0.5
+
+    df['off_center'] = df[['plate_x', 'plate_z', 'sz_top', 'sz_bot']].apply(calc_off_center, axis = 1)
+    return df
+
+def legacy_determine_pitching_batting_team(df):
+    """The original row-wise apply implementation of pyb_tools.determine_pitching_batting_team."""
+    def create_pitching_team(x):
+        home, away, topbot = x
+        return home if topbot == 'Top' else away
+
+    def create_batting_team(x):
+        home, away, topbot = x
+        return away if topbot == 'Top' else home
+
+    df['pitching_team'] = df[['home_team', 'away_team', 'inning_topbot']].apply(create_pitching_team, axis = 1)
+    df['batting_team'] = df[['home_team', 'away_team', 'inning_topbot']].apply(create_batting_team, axis = 1)
+    return df
+
+def geometry(sizes = (10_000, 100_000, 1_000_000)):
+    """Compares the vectorized strike zone geometry against the original apply-based code."""
+    print(f'{"rows":>10} {"stage":<30} {"apply (s)":>10} {"numpy (s)":>10} {"speedup":>8}')
+    for n in sizes:
+        df = synthetic_statcast(n)
+        stages = [('kzone_miss', legacy_kzone_miss, pyb_tools.kzone_miss),
+                  ('off_center', legacy_off_center, pyb_tools.off_center),
+                  ('determine_pitching_batting_team', legacy_determine_pitching_batting_team, pyb_tools.determine_pitching_batting_team)]
+        clean = df.dropna(subset = ['sz_top', 'sz_bot', 'plate_z', 'plate_x'])
+        for name, old, new in stages:
+            old_time, old_df = timed(old, clean.copy())
+            # Each repeat gets its own copy made outside the timing, as off_center returns early once its column exists
+            copies = [clean.copy() for _ in range(3)]
+            new_time, new_df = timed(lambda: new(copies.pop()), repeat = 3)
+            for col in ['high_low', 'off_edge', 'miss_by', 'pitching_team', 'batting_team']:
+                if col in old_df.columns:
+                    assert old_df[col].astype(new_df[col].dtype).equals(new_df[col]), col
+            if 'off_center' in old_df.columns:
+                # sqrt is correctly rounded where the old float ** 0.5 was not, so allow one ulp
+                assert np.allclose(old_df['off_center'], new_df['off_center'], rtol = 1e-15, atol = 0)
+            print(f'{n:>10} {name:<30} {old_time:>10.3f} {new_time:>10.4f} {old_time / new_time:>7.0f}x')
+
+def bundle(n = 200_000, bundle_teams = ('SF', 'LAD', 'NYY', 'BOS', 'HOU')):
+    """Compares one make_leaderboard call per preset and team against a single make_leaderboards pass."""
+    import presets
+    df = synthetic_statcast(n)
+    get_statcast_data = pyb_tools.get_statcast_data
+    pyb_tools.get_statcast_data = lambda start_date, end_date, store = None, columns = None: df.copy()
+    try:
+        def separate():
+            return {(format, team): presets.make_leaderboard('', '', 10, format, teams = [team])
+                    for format in presets.preset_dict for team in bundle_teams}
+        old_time, old = timed(separate)
+        new_time, new = timed(presets.make_leaderboards, '', '', 10, teams = list(bundle_teams))
+    finally:
+        pyb_tools.get_statcast_data = get_statcast_data
+    for key in old:
+        assert list(old[key].index) == list(new[key].index), key
+    print(f'{len(old)} leaderboards over {n} rows: separate {old_time:.2f}s, make_leaderboards {new_time:.2f}s ({old_time / new_time:.1f}x)')
+
+def legacy_daily(df, columns, n, ascending = False):
+    """The original daily leaderboard loop from presets.make_leaderboard."""
+    df = df.sort_values(by = columns, ascending = ascending)
+    df_replacement = pd.DataFrame(columns = df.columns)
+    for date in df['game_date'].unique():
+        df_temp = df.loc[df['game_date'] == date].head(n)
+        df_replacement = pd.concat([df_replacement, df_temp])
+    return df_replacement.sort_values(by = 'game_date', ascending = True)
+
+def topk(sizes = (100_000, 1_000_000), days = 180, n = 5):
+    """Compares full sort + head and the per-day loop against top_n and daily_top_n on 180-day reels."""
+    print(f'{"rows":>10} {"mode":<8} {"old (s)":>10} {"new (s)":>10} {"speedup":>8}')
+    for rows in sizes:
+        df = pyb_tools.kzone_miss(synthetic_statcast(rows, days = days))
+        old_time, old = timed(lambda: df.sort_values(by = ['miss_by'], ascending = False).head(n))
+        new_time, new = timed(pyb_tools.top_n, df, ['miss_by'], n, repeat = 3)
+        assert list(old['miss_by']) == list(new['miss_by'])
+        print(f'{rows:>10} {"top":<8} {old_time:>10.3f} {new_time:>10.4f} {old_time / new_time:>7.1f}x')
+        old_time, old = timed(legacy_daily, df, ['miss_by'], n)
+        new_time, new = timed(pyb_tools.daily_top_n, df, ['miss_by'], n, repeat = 3)
+        assert len(old) == len(new) == days * n
+        print(f'{rows:>10} {"daily":<8} {old_time:>10.3f} {new_time:>10.4f} {old_time / new_time:>7.1f}x')
+
+def wide_statcast(n, seed = 0, days = 180):
+    """Pads synthetic_statcast out to the ~90 columns of a real pybaseball.statcast frame."""
+    df = synthetic_statcast(n, seed, days)
+    rng = np.random.default_rng(seed + 1)
+    extra = {f'metric_{i}': rng.normal(0, 1, n) for i in range(60)}
+    extra.update({f'label_{i}': np.array(['Four-Seam Fastball', 'Slider', 'Changeup', 'Curveball'], dtype = object)[rng.integers(0, 4, n)]
+                  for i in range(10)})
+    return pd.concat([df, pd.DataFrame(extra)], axis = 1)
+
+def memory_child(path, start_date, end_date, compact, chunk_days = None):
+    """Builds one leaderboard from the store at path and prints the peak RSS in MB of this process."""
+    import resource
+    import presets
+    import statcast_store
+    store = statcast_store.StatcastStore(path)
+    presets.make_leaderboard(start_date, end_date, 10, 'walks', store = store, compact = compact == 'True', chunk_days = chunk_days)
+    if sys.platform.startswith('linux'):
+        # ru_maxrss survives exec on Linux and would report the parent's peak, VmHWM does not
+        with open('/proc/self/status') as f:
+            peak = [int(line.split()[1]) for line in f if line.startswith('VmHWM')][0]
+        print(peak / 1024)
+    else:
+        # ru_maxrss is in bytes on macOS
+        print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024))
+
+def fill_store(path, per_day, days, start_date = '2023-03-30'):
+    """Writes days of wide synthetic statcast data to a StatcastStore at path, one day at a time."""
+    import statcast_store
+    store = statcast_store.StatcastStore(path)
+    for day in range(days):
+        date = (pd.Timestamp(start_date) + pd.Timedelta(days = day)).strftime('%Y-%m-%d')
+        if date not in store.manifest:
+            df = wide_statcast(per_day, seed = day, days = 1)
+            df['game_date'] = pd.Timestamp(date)
+            store.write_day(date, df)
+    store.save_manifest()
+    return store
+
+def memory(per_day = 4000, day_counts = (30, 90, 180), path = 'bench_store'):
+    """Reports peak RSS for a full-width leaderboard against a projected, compacted one read from a StatcastStore."""
+    import subprocess
+    fill_store(path, per_day, max(day_counts))
+    start_date = '2023-03-30'
+    print(f'{"days":>6} {"rows":>10} {"full (MB)":>10} {"compact (MB)":>13}')
+    for n_days in day_counts:
+        end_date = (pd.Timestamp(start_date) + pd.Timedelta(days = n_days - 1)).strftime('%Y-%m-%d')
+        peaks = []
+        for compact in (False, True):
+            code = f'import benchmarks; benchmarks.memory_child({path!r}, {start_date!r}, {end_date!r}, {str(compact)!r})'
+            out = subprocess.run([sys.executable, '-c', code], capture_output = True, text = True, check = True)
+            peaks.append(float(out.stdout.split()[-1]))
+        print(f'{n_days:>6} {n_days * per_day:>10} {peaks[0]:>10.0f} {peaks[1]:>13.0f}')
+
+def legacy_generate_captions(argslist):
+    """The original per-clip caption loop, doing two register lookups per clip."""
+    import pybaseball
+    output = []
+    for i, args in enumerate(argslist):
+        df = pybaseball.playerid_reverse_lookup([args['pitcher']])
+        pitcher = df.loc[0, 'name_first'].title() + ' ' + df.loc[0, 'name_last'].title()
+        df = pybaseball.playerid_reverse_lookup([args['batter']])
+        batter = df.loc[0, 'name_first'].title() + ' ' + df.loc[0, 'name_last'].title()
+        output.append(f'{i + 1}) {args["date"]} {pitcher} to {batter}')
+    return output
+
+def captions(clip_counts = (10, 300), register_size = 500_000):
+    """Compares per-clip name lookups with the batched, cached PlayerNameCache on a synthetic Chadwick register."""
+    import pybaseball
+    rng = np.random.default_rng(0)
+    register = pd.DataFrame({'key_mlbam': np.arange(400000, 400000 + register_size),
+                             'name_first': ['first%d' % i for i in range(register_size)],
+                             'name_last': ['last%d' % i for i in range(register_size)]})
+
+    def playerid_reverse_lookup(player_ids, key_type = 'mlbam'):
+        # pybaseball reloads the register on every call, modelled here by a copy
+        df = register.copy()
+        return df.loc[df['key_' + key_type].isin(player_ids)].reset_index(drop = True)
+
+    lookup = pybaseball.playerid_reverse_lookup
+    pybaseball.playerid_reverse_lookup = playerid_reverse_lookup
+    try:
+        print(f'{"clips":>6} {"per clip (s)":>13} {"batched (s)":>12} {"cached (s)":>11}')
+        for n in clip_counts:
+            ids = rng.integers(400000, 400000 + register_size, (n, 2))
+            argslist = [{'pitcher': p, 'batter': b, 'date': '2023-05-01'} for p, b in ids]
+            old_time, old = timed(legacy_generate_captions, argslist)
+            cache = pyb_tools.PlayerNameCache(path = None)
+            new_time, new = timed(pyb_tools.generate_captions, argslist, name_cache = cache)
+            cached_time, _ = timed(pyb_tools.generate_captions, argslist, name_cache = cache)
+            assert old == new
+            print(f'{n:>6} {old_time:>13.3f} {new_time:>12.3f} {cached_time:>11.4f}')
+    finally:
+        pybaseball.playerid_reverse_lookup = lookup
+
+def serve_bytes(data):
+    """Serves data at every path from a local HTTP server thread and returns (server, base url)."""
+    import http.server
+    import threading
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+def legacy_download(source_url, filename):
+    """The original download loop from get_vid_from_url: 8 KB chunks with a flush and fsync after each."""
+    import os
+    import requests
+    r = requests.get(source_url, stream = True)
+    if r.ok:
+        with open(filename, 'wb') as f:
+            for chunk in r.iter_content(chunk_size=1024 * 8):
+                if chunk:
+                    f.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+    return filename
+
+def download(megabytes = 20, n_files = 8):
+    """Compares the original per-chunk fsync download loop with download_file and concurrent download_files."""
+    import os
+    import get_vid
+    server, url = serve_bytes(os.urandom(megabytes * 1024 * 1024))
+    try:
+        old_time, _ = timed(lambda: [legacy_download(f'{url}/{i}.mp4', f'bench_download{i}.mp4') for i in range(n_files)])
+        new_time, _ = timed(lambda: [get_vid.download_file(f'{url}/{i}.mp4', f'bench_download{i}.mp4') for i in range(n_files)])
+        jobs = [(f'{url}/{i}.mp4', f'bench_download{i}.mp4') for i in range(n_files)]
+        parallel_time, _ = timed(get_vid.download_files, jobs)
+    finally:
+        server.shutdown()
+        for i in range(n_files):
+            os.remove(f'bench_download{i}.mp4')
+    total = megabytes * n_files
+    print(f'{n_files} x {megabytes} MB: per-chunk fsync {total / old_time:.0f} MB/s, '
+          f'download_file {total / new_time:.0f} MB/s, download_files {total / parallel_time:.0f} MB/s')
+
+def pipeline(n_clips = 12, download_seconds = 1.5, clip_seconds = 6, n_drivers = 4):
+    """Compares end-to-end wall time of the phased and pipelined compilation flows, with each download stubbed as a sleep and
+    a copy of a local clip. Captions are left out so the benchmark does not need ImageMagick."""
+    import os
+    import shutil
+    import get_vid
+    from moviepy.editor import ColorClip
+    ColorClip((1280, 720), color = (20, 60, 20), duration = clip_seconds).write_videofile('bench_fixture.mp4', fps = 30, logger = None)
+
+    def fetch_clip(url, driver, filename = 'highlight.mp4', *args, **kwargs):
+        time.sleep(download_seconds)
+        shutil.copyfile('bench_fixture.mp4', filename)
+        return filename, None
+
+    fetch, get_vid.fetch_clip = get_vid.fetch_clip, fetch_clip
+    urls = [f'bench://clip/{i}' for i in range(n_clips)]
+    try:
+        phased_time, _ = timed(get_vid.create_compilation_from_urls, urls, 'bench_phased.mp4', n_drivers = n_drivers, pipelined = False)
+        pipelined_time, _ = timed(get_vid.create_compilation_from_urls, urls, 'bench_pipelined.mp4', n_drivers = n_drivers, pipelined = True)
+    finally:
+        get_vid.fetch_clip = fetch
+        for name in ['bench_fixture.mp4', 'bench_phased.mp4', 'bench_pipelined.mp4']:
+            if os.path.exists(name):
+                os.remove(name)
+    print(f'{n_clips} clips, {download_seconds}s downloads: phased {phased_time:.1f}s, pipelined {pipelined_time:.1f}s '
+          f'({phased_time / pipelined_time:.2f}x)')
+
+def encode(n_clips = 8, clip_seconds = 8, worker_counts = None):
+    """Compares encoding a compilation in one pass with encoding per-clip segments in a process pool and joining them
+    by stream copy, for each worker count up to the number of cores."""
+    import os
+    import render
+    from moviepy.editor import ColorClip
+    if worker_counts is None:
+        worker_counts = sorted({1, 2, 4, 8, 16, os.cpu_count()} & set(range(1, os.cpu_count() + 1)))
+    for i in range(n_clips):
+        ColorClip((1280, 720), color = (20, 8 * i, 20), duration = clip_seconds).write_videofile(f'bench_clip{i}.mp4', fps = 60, logger = None)
+    clips = [f'bench_clip{i}.mp4' for i in range(n_clips)]
+    try:
+        single_time, _ = timed(lambda: render.join_clips([render.prepare_clip(clip) for clip in clips], 'bench_single.mp4'))
+        for n_workers in worker_counts:
+            jobs = [(clip, f'bench_segment{i}.mp4') for i, clip in enumerate(clips)]
+            pool_time, _ = timed(lambda: render.join_segments(render.render_segments(jobs, n_workers), 'bench_segments.mp4'))
+            print(f'{n_clips} clips, {n_workers} workers: one pass {single_time:.1f}s, segments {pool_time:.1f}s ({single_time / pool_time:.2f}x)')
+    finally:
+        for name in clips + [f'bench_segment{i}.mp4' for i in range(n_clips)] + ['bench_single.mp4', 'bench_segments.mp4']:
+            if os.path.exists(name):
+                os.remove(name)
+
+def overlay(n_frames = 120, size = (1280, 720), caption_size = (900, 48)):
+    """Compares per-frame compositing of a caption with CompositeVideoClip and with render.overlay.
+    The caption is a synthetic bitmap so the benchmark does not need ImageMagick."""
+    import render
+    from moviepy.editor import CompositeVideoClip, ImageClip
+    rng = np.random.default_rng(0)
+    w, h = caption_size
+    rgb = np.full((h, w, 3), 255, dtype = np.uint8)
+    alpha = np.clip(rng.normal(0.3, 0.4, (h, w)), 0, 1)
+    clip = ImageClip(rng.integers(0, 256, (size[1], size[0], 3), dtype = np.uint8)).set_duration(10)
+    pos = (60, clip.h - 140)
+    text = ImageClip(rgb).set_mask(ImageClip(alpha, ismask = True)).set_position(pos).set_duration(clip.duration)
+    composite = CompositeVideoClip([clip, text])
+    bitmap = render.premultiply(rgb, alpha)
+    times = np.linspace(0, clip.duration, n_frames, endpoint = False)
+    old_time, old_frames = timed(lambda: [composite.get_frame(t) for t in times])
+    new_time, new_frames = timed(lambda: [render.overlay(clip.get_frame(t), bitmap, pos) for t in times])
+    same = all((old == new).all() for old, new in zip(old_frames, new_frames))
+    print(f'{n_frames} frames at {size[0]}x{size[1]}: CompositeVideoClip {1000 * old_time / n_frames:.1f} ms/frame, '
+          f'overlay {1000 * new_time / n_frames:.1f} ms/frame ({old_time / new_time:.1f}x), identical: {same}')
+
+def trim(n_clips = 4, clip_seconds = 90, max_duration = 8):
+    """Compares rendering segments from long clips with max_duration = 8 when the window is decoded through moviepy's reader
+    and when it is first cut out by keyframe seek and stream copy."""
+    import os
+    import subprocess
+    import render
+    from moviepy.config import get_setting
+    clips = [f'bench_long{i}.mp4' for i in range(n_clips)]
+    for clip in clips:
+        subprocess.run([get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error', '-f', 'lavfi', '-i', f'testsrc=size=1280x720:rate=60:duration={clip_seconds}',
+                        '-f', 'lavfi', '-i', f'sine=duration={clip_seconds}', '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '120', '-c:a', 'aac', clip],
+                       check = True)
+    try:
+        probe_time, _ = timed(lambda: [render.probe_clip(clip) for clip in clips])
+        open_time, _ = timed(lambda: [render.prepare_clip(clip, max_duration = max_duration).close() for clip in clips])
+        old_time, _ = timed(lambda: [render.render_segment(clip, 'bench_segment.mp4', max_duration = max_duration, trim = False) for clip in clips])
+        new_time, _ = timed(lambda: [render.render_segment(clip, 'bench_segment.mp4', max_duration = max_duration) for clip in clips])
+    finally:
+        for name in clips + ['bench_segment.mp4']:
+            if os.path.exists(name):
+                os.remove(name)
+    print(f'{n_clips} x {clip_seconds}s clips, max_duration {max_duration}: probe {1000 * probe_time / n_clips:.0f} ms/clip, '
+          f'VideoFileClip open {1000 * open_time / n_clips:.0f} ms/clip')
+    print(f'render_segment: reader trim {old_time / n_clips:.2f}s/clip, seek trim {new_time / n_clips:.2f}s/clip ({old_time / new_time:.2f}x)')
+
+def urls(sizes = (100, 10_000)):
+    """Compares building search args row by row with df.iloc and column by column, and counts the searches left after coalescing."""
+    import get_vid
+    for n in sizes:
+        df = synthetic_statcast(n)
+        old_time, old_args = timed(lambda: [pyb_tools.get_search_args(df.iloc[i]) for i in range(len(df))])
+        new_time, new_args = timed(pyb_tools.get_search_args_list, df)
+        old_urls = get_vid.get_search_urls(old_args)
+        assert old_urls == get_vid.get_search_urls(new_args)
+        print(f'{n:>6} rows: iloc loop {old_time * 1000:.1f} ms, columns {new_time * 1000:.1f} ms ({old_time / new_time:.0f}x), '
+              f'{len(get_vid.coalesce_searches(old_urls))} distinct searches')
+
+def streaming(per_day = 4000, day_counts = (30, 90, 180, 360), chunk_days = 7, path = 'bench_store'):
+    """Reports peak RSS of an in-memory leaderboard against one streamed chunk_days at a time from a StatcastStore,
+    and checks that both give the same leaderboards."""
+    import subprocess
+    import presets
+    store = fill_store(path, per_day, max(day_counts))
+    start_date = '2023-03-30'
+    end_date = (pd.Timestamp(start_date) + pd.Timedelta(days = min(day_counts) - 1)).strftime('%Y-%m-%d')
+    for daily in (False, True):
+        full = presets.make_leaderboards(start_date, end_date, 10, daily = daily, store = store)
+        streamed = presets.make_leaderboards(start_date, end_date, 10, daily = daily, store = store, chunk_days = chunk_days)
+        for key in full:
+            pd.testing.assert_frame_equal(full[key], streamed[key], check_dtype = False, check_categorical = False)
+    print(f'{"days":>6} {"rows":>10} {"in memory (MB)":>15} {"streamed (MB)":>14}')
+    for n_days in day_counts:
+        end_date = (pd.Timestamp(start_date) + pd.Timedelta(days = n_days - 1)).strftime('%Y-%m-%d')
+        peaks = []
+        for chunks in (None, chunk_days):
+            code = f'import benchmarks; benchmarks.memory_child({path!r}, {start_date!r}, {end_date!r}, "True", {chunks!r})'
+            out = subprocess.run([sys.executable, '-c', code], capture_output = True, text = True, check = True)
+            peaks.append(float(out.stdout.split()[-1]))
+        print(f'{n_days:>6} {n_days * per_day:>10} {peaks[0]:>15.0f} {peaks[1]:>14.0f}')
+
+def parallel(per_day = 4000, days = 180, worker_counts = (1, 2, 4, 8, 16), shard_days = 7, path = 'bench_store'):
+    """Times every preset's leaderboard for a range read from a StatcastStore, serially and with parallel_leaderboards
+    for each worker count, and checks that the results are identical."""
+    import presets
+    store = fill_store(path, per_day, days)
+    start_date = '2023-03-30'
+    end_date = (pd.Timestamp(start_date) + pd.Timedelta(days = days - 1)).strftime('%Y-%m-%d')
+    serial_time, serial = timed(presets.make_leaderboards, start_date, end_date, 10, store = store)
+    print(f'{days} days, {days * per_day} rows, {len(serial)} leaderboards: serial {serial_time:.2f}s')
+    for n_workers in worker_counts:
+        parallel_time, result = timed(presets.make_leaderboards, start_date, end_date, 10, store = store, chunk_days = shard_days, n_workers = n_workers)
+        for key in serial:
+            pd.testing.assert_frame_equal(serial[key], result[key], check_dtype = False, check_categorical = False)
+        print(f'{n_workers:>3} workers: {parallel_time:.2f}s ({serial_time / parallel_time:.2f}x)')
+    # Two weeks without games after the last stored day, so whole shards and part of one are offseason
+    offseason = [d.strftime('%Y-%m-%d') for d in pd.date_range(pd.Timestamp(end_date) + pd.Timedelta(days = 1), periods = 14)]
+    for date in offseason:
+        store.write_day(date, None)
+    store.save_manifest()
+    try:
+        serial = presets.make_leaderboards(start_date, offseason[-1], 10, store = store)
+        result = presets.make_leaderboards(start_date, offseason[-1], 10, store = store, chunk_days = shard_days, n_workers = worker_counts[-1])
+        for key in serial:
+            pd.testing.assert_frame_equal(serial[key], result[key], check_dtype = False, check_categorical = False)
+    finally:
+        # fill_store skips days in the manifest, so drop these before a longer range is stored here
+        for date in offseason:
+            del store.manifest[date]
+        store.save_manifest()
+    print(f'{len(offseason)} days past the season end: parallel matches serial')
+
+def import_seconds(module, repeat = 3):
+    """Best cumulative import time in seconds of module in a fresh interpreter, read from python -X importtime,
+    plus the heavy optional packages that importing it loaded."""
+    import subprocess
+    heavy = ['moviepy', 'selenium', 'bs4', 'requests', 'pybaseball']
+    code = f'import sys, {module}; print([m for m in {heavy!r} if m in sys.modules])'
+    best = float('inf')
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output = True, text = True, check = True)
+        lines = [line for line in out.stderr.splitlines() if line.split('|')[-1].strip() == module]
+        best = min(best, int(lines[-1].split('|')[1]) / 1e6)
+    return best, eval(out.stdout)
+
+def startup(budget = 1.0):
+    """Checks that importing presets for leaderboards stays under budget seconds and loads none of the video, browser or
+    HTTP stack, and reports what the reel path costs when it is first used."""
+    print(f'{"module":<10} {"import (s)":>11}  heavy packages loaded')
+    for module in ['presets', 'get_vid', 'render']:
+        seconds, loaded = import_seconds(module)
+        print(f'{module:<10} {seconds:>11.3f}  {", ".join(loaded) or "-"}')
+        if module == 'presets':
+            presets_time, presets_loaded = seconds, loaded
+    assert presets_time <= budget, f'import presets took {presets_time:.3f}s, over the {budget}s budget'
+    assert len(presets_loaded) == 0, f'import presets loaded {presets_loaded}'
+
+def legacy_team_leaderboard(df, n, format, teams):
+    """The original leaderboard_from_data team filter: run the preset on the whole frame, then test the home and away team of every row."""
+    import presets
+    df = presets.preset_dict[format]['tool'](pyb_tools.derive_features(df), teams, [])
+    df['filter'] = df[['home_team', 'away_team']].apply(lambda x: (x.iloc[0] in teams) or (x.iloc[1] in teams), axis = 1)
+    df = df.loc[df['filter']]
+    return presets.rank_leaderboard(df, n, format)
+
+def team_batch(n = 10_000):
+    """Times leaderboards for all 30 teams times every preset from one frame: the original per-row team filter against
+    the shared GroupIndex, and checks both give the same rows."""
+    import presets
+    df = pyb_tools.derive_features(pyb_tools.compact_statcast(synthetic_statcast(n)))
+    jobs = {(format, team): (10, format, False, [team], [], False) for format in presets.preset_dict for team in teams}
+    old_time, old = timed(lambda: {key: legacy_team_leaderboard(df, 10, key[0], [key[1]]) for key in jobs})
+    new_time, (_, new) = timed(presets.chunk_leaderboards, df, jobs)
+    for key in jobs:
+        pd.testing.assert_frame_equal(old[key], new[key], check_dtype = False)
+    print(f'{n} rows, {len(jobs)} leaderboards: row-wise filter {old_time:.2f}s, GroupIndex {new_time:.2f}s ({old_time / new_time:.1f}x)')
+
+def tracing(n = 100_000, n_calls = 1_000_000, n_clips = 4, clip_seconds = 6):
+    """Measures what the instrument module costs: a disabled span per call, and ranking every preset with tracing off and on.
+    Then traces a pipelined compilation of clips served from a local HTTP server, with the search lookup stubbed out,
+    and checks the JSON trace has the stage spans and per-clip download and encode metrics."""
+    import json
+    import os
+    import get_vid
+    import instrument
+    import presets
+    from moviepy.editor import ColorClip
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        with instrument.span('bench'):
+            pass
+    span_time = (time.perf_counter() - start) / n_calls
+    df = pyb_tools.derive_features(pyb_tools.compact_statcast(synthetic_statcast(n)))
+    jobs = {format: (10, format, False, [], [], False) for format in presets.preset_dict}
+    off_time, (_, off) = timed(presets.chunk_leaderboards, df, jobs, repeat = 3)
+    tracer = instrument.start(profile = 'presets.tool')
+    try:
+        on_time, (_, on) = timed(presets.chunk_leaderboards, df, jobs, repeat = 3)
+    finally:
+        instrument.stop()
+    for key in jobs:
+        pd.testing.assert_frame_equal(off[key], on[key])
+    assert tracer.stages()['presets.tool'][0] == 3 * len(jobs)
+    assert 'pyb_tools' in tracer.profile_stats()
+    print(f'disabled span {span_time * 1e9:.0f} ns/call; {len(jobs)} leaderboards on {n} rows: '
+          f'untraced {off_time:.3f}s, traced and profiled {on_time:.3f}s')
+
+    ColorClip((1280, 720), color = (20, 60, 20), duration = clip_seconds).write_videofile('bench_fixture.mp4', fps = 30, logger = None)
+    with open('bench_fixture.mp4', 'rb') as f:
+        server, url = serve_bytes(f.read())
+    resolve = get_vid.resolve_source_url
+    get_vid.resolve_source_url = lambda search, *args, **kwargs: (None, f'{url}/{search.rpartition("/")[2]}.mp4')
+    try:
+        with instrument.tracing('bench_trace.json'):
+            get_vid.create_compilation_from_urls([f'bench://clip/{i}' for i in range(n_clips)], 'bench_traced.mp4', n_drivers = 2)
+        with open('bench_trace.json') as f:
+            trace = json.load(f)
+    finally:
+        get_vid.resolve_source_url = resolve
+        server.shutdown()
+        for name in ['bench_fixture.mp4', 'bench_traced.mp4', 'bench_trace.json']:
+            if os.path.exists(name):
+                os.remove(name)
+    names = {event['name'] for event in trace['traceEvents']}
+    assert {'get_vid.clip', 'get_vid.resolve', 'get_vid.download', 'render.segment', 'render.join_segments'} <= names, names
+    assert len(trace['clips']) == n_clips
+    assert all(('download_mbps' in clip) and ('encode_fps' in clip) for clip in trace['clips'])
+
+def daily(days = 5, per_day = 2000, n_highlights = 2, clip_seconds = 4, format = 'called_corners', path = 'bench_daily'):
+    """Runs a daily reel for days days, adds a day and compares rebuilding the whole reel with the incremental daily_reel update.
+    Then changes one day's data and checks only that day is rendered again. Clips are served from a local HTTP server with the
+    search lookup and player names stubbed out. Captions need ImageMagick, as for real reels."""
+    import os
+    import shutil
+    import daily_reel
+    import get_vid
+    import presets
+    import pybaseball
+    import render
+    from moviepy.editor import ColorClip
+    store = fill_store(os.path.join(path, 'store'), per_day, days)
+    start_date = min(store.manifest)
+    first_end = max(store.manifest)
+    end_date = (pd.Timestamp(first_end) + pd.Timedelta(days = 1)).strftime('%Y-%m-%d')
+    ColorClip((1280, 720), color = (20, 60, 20), duration = clip_seconds).write_videofile('bench_fixture.mp4', fps = 30, logger = None)
+    with open('bench_fixture.mp4', 'rb') as f:
+        server, url = serve_bytes(f.read())
+
+    def playerid_reverse_lookup(player_ids, key_type = 'mlbam'):
+        return pd.DataFrame({'key_mlbam': player_ids, 'name_first': [f'first{i}' for i in player_ids], 'name_last': [f'last{i}' for i in player_ids]})
+
+    resolve, lookup, names = get_vid.resolve_source_url, pybaseball.playerid_reverse_lookup, pyb_tools.player_names
+    get_vid.resolve_source_url = lambda search, *args, **kwargs: (None, f'{url}/clip.mp4')
+    pybaseball.playerid_reverse_lookup = playerid_reverse_lookup
+    pyb_tools.player_names = pyb_tools.PlayerNameCache(path = None)
+    try:
+        reel = daily_reel.DailyReel(os.path.join(path, 'reel'))
+        presets.make_daily_reel(reel, start_date, first_end, n_highlights, format, store = store, output = 'bench_daily.mp4')
+        store = fill_store(os.path.join(path, 'store'), per_day, days + 1)
+
+        def full():
+            df = presets.make_leaderboard(start_date, end_date, n_highlights, format, True, store = store)
+            df['flavor'] = df[presets.preset_dict[format]['flavor_columns']].apply(presets.preset_dict[format]['flavor_func'], axis = 1)
+            args = pyb_tools.get_search_args_list(df)
+            captions = pyb_tools.generate_captions(args, list(df['flavor']))
+            get_vid.create_compilation_from_args(args, 'bench_full.mp4', captions)
+            return captions
+
+        full_time, captions = timed(full)
+        new_time, _ = timed(presets.make_daily_reel, reel, start_date, end_date, n_highlights, format, store = store, output = 'bench_daily.mp4')
+        reel_captions = []
+        for date, day in sorted(reel.days.items()):
+            reel_captions += pyb_tools.generate_captions(day['rows'], [row['flavor'] for row in day['rows']], first = day['first'])
+        assert reel_captions == captions
+        full_seconds, new_seconds = render.probe_clip('bench_full.mp4')['duration'], render.probe_clip('bench_daily.mp4')['duration']
+        assert abs(full_seconds - new_seconds) < 0.1 * len(captions), (full_seconds, new_seconds)
+        print(f'{days} days + 1, {len(captions)} clips: full rebuild {full_time:.1f}s, incremental {new_time:.1f}s ({full_time / new_time:.1f}x)')
+
+        changed = sorted(reel.days)[days // 2]
+        df = wide_statcast(per_day, seed = 1000, days = 1)
+        df['game_date'] = pd.Timestamp(changed)
+        store.write_day(changed, df)
+        store.save_manifest()
+        before = {date: os.path.getmtime(reel.day_path(date)) for date in reel.days}
+        changed_time, _ = timed(presets.make_daily_reel, reel, start_date, end_date, n_highlights, format, store = store, output = 'bench_daily.mp4')
+        rendered = [date for date in reel.days if os.path.getmtime(reel.day_path(date)) != before[date]]
+        assert rendered == [changed], rendered
+        print(f'changed {changed}: {changed_time:.1f}s, rendered {rendered}')
+    finally:
+        get_vid.resolve_source_url, pybaseball.playerid_reverse_lookup, pyb_tools.player_names = resolve, lookup, names
+        server.shutdown()
+        shutil.rmtree(path, ignore_errors = True)
+        for name in ['bench_fixture.mp4', 'bench_full.mp4', 'bench_daily.mp4']:
+            if os.path.exists(name):
+                os.remove(name)
+
+benchmarks = {'geometry': geometry,
+              'bundle': bundle,
+              'topk': topk,
+              'memory': memory,
+              'captions': captions,
+              'download': download,
+              'pipeline': pipeline,
+              'encode': encode,
+              'overlay': overlay,
+              'trim': trim,
+              'urls': urls,
+              'streaming': streaming,
+              'parallel': parallel,
+              'startup': startup,
+              'teams': team_batch,
+              'tracing': tracing,
+              'daily': daily}
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or list(benchmarks):
+        print(f'== {name} ==')
+        benchmarks[name]()
@@ -0,0 +1,120 @@
+# Persistent, content-addressed cache of downloaded highlight clips
+import hashlib
+import json
+import os
+import threading
+import time
+
+class ClipCache:
+    """Stores each clip's resolved mp4 url and downloaded file under path, keyed by its search url and home/away feed.
+    Files are written to a temporary name and renamed into place, so several workers or processes can share one cache.
+    Once the cached videos exceed max_bytes, the least recently used ones are deleted, skipping any used in the last protect_seconds.
+    The small .json records keep the mp4 url, so an evicted clip is downloaded again without scraping."""
+
+    def __init__(self, path = 'clip_cache', max_bytes = 5 * 1024 ** 3, protect_seconds = 600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.protect_seconds = protect_seconds
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok = True)
+
+    def key(self, url, away = False, pitch = None) -> str:
+        """Content address of a clip: sha256 of its search url (without the #fragment), feed and the pitch attributes that pick its result."""
+        url = url.split('#')[0]
+        key = f'{url}|{"away" if away else "home"}'
+        if pitch:
+            key += '|' + json.dumps(pitch, sort_keys = True, default = str)
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def video_path(self, key):
+        return os.path.join(self.path, key + '.mp4')
+
+    def record_path(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def get(self, url, away = False, pitch = None):
+        """Returns the cached video's path and marks it as recently used, or None on a miss. Counts hits and misses."""
+        path = self.video_path(self.key(url, away, pitch))
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return path
+
+    def get_source(self, url, away = False, pitch = None):
+        """Returns the mp4 url resolved earlier for this clip, or None."""
+        try:
+            with open(self.record_path(self.key(url, away, pitch))) as f:
+                return json.load(f).get('source_url')
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, url, away, filename, source_url = None, pitch = None) -> str:
+        """Moves a downloaded video into the cache and records its mp4 url. Returns the cached path."""
+        key = self.key(url, away, pitch)
+        suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        record = {'url': url, 'away': bool(away), 'pitch': pitch, 'source_url': source_url, 'stored': time.time()}
+        self.write_atomic(self.record_path(key), json.dumps(record).encode(), suffix)
+        path = self.video_path(key)
+        tmp = path + suffix
+        if same_device(filename, self.path):
+            os.replace(filename, tmp)
+        else:
+            copy_file(filename, tmp)
+        os.replace(tmp, path)
+        if os.path.exists(filename):
+            os.remove(filename)
+        self.evict()
+        return path
+
+    def write_atomic(self, path, data, suffix):
+        tmp = path + suffix
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def evict(self):
+        """Deletes the least recently used videos until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith('.mp4'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if now - mtime < self.protect_seconds:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def report(self, since = (0, 0)) -> str:
+        """Summarizes the hits and misses counted since since, an earlier (hits, misses) reading."""
+        return f'Clip cache: {self.hits - since[0]} hits, {self.misses - since[1]} misses'
+
+def same_device(a, b) -> bool:
+    """Whether two paths are on the same filesystem, so a rename can move a file between them."""
+    return os.stat(a).st_dev == os.stat(b).st_dev
+
+def copy_file(src, dst):
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        while True:
+            chunk = fin.read(1024 * 1024)
+            if not chunk:
+                break
+            fout.write(chunk)
@@ -0,0 +1,105 @@
+# Saved state of a daily highlight reel, so each run only renders the days that are new or changed
+import hashlib
+import json
+import os
+from manifest import Manifest
+
+class DailyReel(Manifest):
+    """Keeps the state of a daily highlight reel under path: one encoded video per game_date, plus a manifest with each day's
+    leaderboard rows, a hash of those rows, the caption number of its first clip and a hash of the statcast data it came from.
+    Without a store, a day computed less than settle_days after it was played may still change, so it is recomputed on the next run.
+    If the reel settings (preset, number of clips, filters, clip edits) change, every saved day is dropped.
+    The manifest is {'settings': dict, 'days': {date: day record}}."""
+
+    def __init__(self, path = 'daily_reel', settle_days = 2):
+        self.path = path
+        self.settle_days = settle_days
+        self.manifest_path = os.path.join(path, 'manifest.json')
+        os.makedirs(path, exist_ok = True)
+        self.manifest = self.load_manifest()
+
+    @staticmethod
+    def empty_manifest():
+        return {'settings': None, 'days': {}}
+
+    @property
+    def days(self) -> dict:
+        return self.manifest['days']
+
+    def day_path(self, date):
+        """Path of the encoded video of one game_date."""
+        return os.path.join(self.path, f'{date}.mp4')
+
+    def segment_path(self, date, k):
+        """Path of the k-th clip of a game_date while the day is being rendered."""
+        return os.path.join(self.path, f'{date}.{k}.mp4')
+
+    def use_settings(self, settings):
+        """Drops every saved day if settings differ from the ones the saved days were built with."""
+        settings = json.loads(json.dumps(settings, default = str))
+        if self.manifest['settings'] != settings:
+            for date in self.days:
+                if os.path.exists(self.day_path(date)):
+                    os.remove(self.day_path(date))
+            self.manifest = {'settings': settings, 'days': {}}
+
+    def stale_dates(self, dates, store = None) -> list:
+        """Lists the dates whose leaderboard rows need computing: days never computed and, with a statcast_store.StatcastStore,
+        days whose stored data hash changed since, or without one, days that were not yet final when they were computed."""
+        output = []
+        for date in dates:
+            day = self.days.get(date)
+            if day is None:
+                output.append(date)
+            elif store is not None:
+                if day['source'] != store.manifest.get(date, {}).get('hash'):
+                    output.append(date)
+            elif not day['final']:
+                output.append(date)
+        return output
+
+    def set_rows(self, date, rows, source = None):
+        """Records the leaderboard rows (search args with a 'flavor' key) of one day. source is the hash of the data they came from."""
+        rows = json.loads(json.dumps(rows, default = str))
+        day = self.days.setdefault(date, {'rendered': None})
+        day.update({'rows': rows, 'hash': rows_hash(rows), 'source': source, 'final': self.is_final(date)})
+        if (len(rows) == 0) and os.path.exists(self.day_path(date)):
+            os.remove(self.day_path(date))
+
+    def number(self, dates):
+        """Sets the caption number of the first clip of each date, in date order, and drops saved days outside dates."""
+        for date in [d for d in self.days if d not in dates]:
+            if os.path.exists(self.day_path(date)):
+                os.remove(self.day_path(date))
+            del self.days[date]
+        first = 1
+        for date in sorted(dates):
+            self.days[date]['first'] = first
+            first += len(self.days[date]['rows'])
+
+    def dates_to_render(self) -> list:
+        """Dates whose video is missing or out of date: new days, days whose rows changed, days whose caption numbers shifted
+        because an earlier day changed, and days where a clip failed last time."""
+        output = []
+        for date, day in sorted(self.days.items()):
+            rendered = day['rendered']
+            if len(day['rows']) == 0:
+                continue
+            if (rendered is None) or (rendered['hash'] != day['hash']) or (rendered['first'] != day['first']) or \
+               (rendered['failures'] > 0) or (not os.path.exists(self.day_path(date))):
+                output.append(date)
+        return output
+
+    def set_rendered(self, date, failures = 0):
+        """Marks a day's video as up to date with its current rows and numbering."""
+        day = self.days[date]
+        day['rendered'] = {'hash': day['hash'], 'first': day['first'], 'failures': failures}
+
+    def videos(self, countdown = True) -> list:
+        """Paths of the rendered day videos in compilation order: newest day first with countdown, oldest first without."""
+        output = [self.day_path(date) for date in sorted(self.days) if os.path.exists(self.day_path(date))]
+        return output[::-1] if countdown else output
+
+def rows_hash(rows) -> str:
+    """sha256 of a day's leaderboard rows, used to tell whether its clips or captions changed."""
+    return hashlib.sha256(json.dumps(rows, sort_keys = True, default = str).encode()).hexdigest()
@@ -1,10 +1,11 @@
-# Selenium tools to scrape BaseballSavant
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from bs4 import BeautifulSoup
+# Tools to scrape BaseballSavant over HTTP, with Selenium as a fallback
+# selenium, requests, bs4 and the moviepy-based render module are imported inside the functions that use them,
+# so building search urls (and importing presets for leaderboards) does not load the browser and video stack
 import time, os
-import requests
-from moviepy.editor import concatenate_videoclips, VideoFileClip, CompositeVideoClip, TextClip
+import queue, threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urljoin, urlsplit
+import instrument
 
 # Multi-result searches concatenated by '%7C'
 result_dict = {'called_strike': 'called%5C.%5C.strike',
@@ -24,21 +25,31 @@ result_dict = {'called_strike': 'called%5C.%5C.strike',
                'swinging_strike': 'swinging%5C.%5C.strike',
                'swinging_strike_blocked': 'swinging%5C.%5C.strike%5C.%5C.blocked'} #Need to investigate other results
 
+savant_url = 'https://baseballsavant.mlb.com'
+session = None
+session_lock = threading.Lock()
+
 def init_driver():
+    from selenium import webdriver
     chromedriver = '/Applications/chromedriver'
     os.environ['webdriver.chrome.driver'] = chromedriver
     driver = webdriver.Chrome(chromedriver)
     return driver
 
-def get_search_url(pitcher = '', batter = '', date = '', inning = '', balls = '', strikes = '', result = '', **kwargs):
-    """Takes statcast search parameters and gives the url for the search results."""
+default_season = '2023'
+
+def get_search_url(pitcher = '', batter = '', date = '', inning = '', balls = '', strikes = '', result = '', season = '', **kwargs):
+    """Takes statcast search parameters and gives the url for the search results. The season defaults to the year of date."""
+    if season == '':
+        season = str(date)[:4] or default_season
     url = 'https://baseballsavant.mlb.com/statcast_search?'
     url += f'hfPTM=&hfPT=&hfAB=&hfGT=R%7C&hfPR={result_dict[result]}%7C&hfZ=&hfStadium=&hfBBL=&hf'
-    url += f'NewZones=&hfPull=&hfC={balls}{strikes}%7C&hfSea=2023%7C&hfSit=&player_type=pitcher&hfOuts=&hfOpponent=&pitcher_throws=&batter_stands=&hfSA=&game_date_gt={date}&game_date_lt={date}&hfMo=&hfTeam=&home_road=&hfRO=&position=&hfInfield=&hfOutfield=&hfInn={inning}%7C&hfBBT=&'
+    url += f'NewZones=&hfPull=&hfC={balls}{strikes}%7C&hfSea={season}%7C&hfSit=&player_type=pitcher&hfOuts=&hfOpponent=&pitcher_throws=&batter_stands=&hfSA=&game_date_gt={date}&game_date_lt={date}&hfMo=&hfTeam=&home_road=&hfRO=&position=&hfInfield=&hfOutfield=&hfInn={inning}%7C&hfBBT=&'
     url += f'batters_lookup%5B%5D={batter}&hfFlag=&pitchers_lookup%5B%5D={pitcher}'
     url += '&metric_1=&group_by=name&min_pitches=0&min_results=0&min_pas=0&sort_col=pitches&player_event_sort=api_p_release_speed&sort_order=desc#results'
     return url
 
+@instrument.traced('get_vid.get_search_urls')
 def get_search_urls(param_list):
     """Takes in a list of argument dictionaries and gets the URLs for each of them, returning a list of URLs"""
     output = []
@@ -46,36 +57,343 @@ def get_search_urls(param_list):
         output.append(get_search_url(**p))
     return output
 
-def get_vid_from_url(url: str, driver, filename = 'highlight.mp4', away = False):
-    """Takes in a url as a string and uses Selenium to download the video, returning the filename. Retrieves first video in results"""
-    pass
+def coalesce_searches(urls) -> list:
+    """Groups clips with identical search urls, so one results page serves all of them.
+    Returns (url, [clip index, ...]) per distinct url in first-seen order. Which result each clip takes is decided by pick_play."""
+    groups = {}
+    for i, url in enumerate(urls):
+        groups.setdefault(url, []).append(i)
+    return list(groups.items())
+
+def get_pitches(args) -> list:
+    """The attributes that tell apart pitches sharing a search url (pyb_tools.pitch_columns) from each arg dictionary, for pick_play."""
+    from pyb_tools import pitch_columns
+    return [{col: int(arg[col]) for col in pitch_columns if col in arg} for arg in args]
+
+class NoMatchingPlay(LookupError):
+    """Raised when no search result matches a clip's pitch. The Selenium fallback cannot pick by pitch, so the clip fails instead."""
+
+def pick_play(rows, pitch = None, url = '') -> str:
+    """Returns the play id of the search result matching pitch, a dict of pitch attributes such as at_bat_number and pitch_number.
+    Only attributes the result rows carry are compared. Without any to compare, the first result is taken, as a search url cannot say more."""
+    candidates = rows
+    if pitch:
+        keys = [key for key in pitch if any(key in row for row in rows)]
+        candidates = [row for row in rows if all(str(row.get(key)) == str(pitch[key]) for key in keys)]
+    if len(candidates) == 0:
+        raise NoMatchingPlay(f'No play matching {pitch} found for statcast search with url: {url}')
+    return candidates[0]['play_id']
+
+def wait_for(driver, condition, timeout = 20, poll = 0.25):
+    """Polls condition(driver) every poll seconds and returns its first truthy result, raising TimeoutException after timeout seconds."""
+    from selenium.webdriver.support.ui import WebDriverWait
+    return WebDriverWait(driver, timeout, poll_frequency = poll).until(condition)
+
+def video_source(driver, previous = None):
+    """Wait condition returning the populated src of video#sporty, ignoring previous (the feed shown before switching)."""
+    from selenium.webdriver.common.by import By
+    for source in driver.find_elements(By.CSS_SELECTOR, 'video#sporty source[src]'):
+        src = source.get_attribute('src')
+        if src and (src != previous):
+            return src
+    return False
+
+def get_session():
+    """Returns the shared requests.Session, which keeps connections to BaseballSavant alive and retries transient errors."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    global session
+    with session_lock:
+        if session is None:
+            session = requests.Session()
+            retries = Retry(total = 3, backoff_factor = 0.5, status_forcelist = [429, 500, 502, 503, 504])
+            adapter = HTTPAdapter(pool_connections = 4, pool_maxsize = 16, max_retries = retries)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+    return session
+
+class IncompleteDownload(IOError):
+    """Raised when a response ends before Content-Length bytes have arrived."""
+
+class ByteBudget:
+    """Caps the bytes buffered in memory across concurrent downloads. Each reservation waits until it fits under capacity."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, n):
+        with self.condition:
+            # A reservation larger than the whole budget still goes through once nothing else is in flight
+            while (self.used > 0) and (self.used + n > self.capacity):
+                self.condition.wait()
+            self.used += n
+
+    def release(self, n):
+        with self.condition:
+            self.used -= n
+            self.condition.notify_all()
+
+def part_validator(part, source_url):
+    """Returns the ETag or Last-Modified value that a .part file of source_url was downloaded under, or None.
+    A .part file that has no sidecar, or whose sidecar names another url, cannot be resumed and is deleted."""
+    import json
+    if not os.path.exists(part):
+        return None
+    try:
+        with open(part + '.json') as f:
+            record = json.load(f)
+    except (FileNotFoundError, ValueError):
+        record = {}
+    if record.get('url') != source_url:
+        remove_part(part)
+        return None
+    return record.get('validator')
+
+def start_part(part, source_url, r):
+    """Records which url and version of it a new .part file holds. Weak ETags cannot be used with If-Range, so Last-Modified is kept instead."""
+    import json
+    etag = r.headers.get('ETag')
+    validator = etag if (etag is not None) and (not etag.startswith('W/')) else r.headers.get('Last-Modified')
+    with open(part + '.json', 'w') as f:
+        json.dump({'url': source_url, 'validator': validator}, f)
+
+def remove_part(part):
+    for path in (part, part + '.json'):
+        if os.path.exists(path):
+            os.remove(path)
+
+def download_file(source_url, filename, session = None, timeout = 20, buffer_size = 1024 * 1024, retries = 3, budget = None) -> str:
+    """Streams source_url into filename and returns filename.
+    Data goes to filename + '.part' in buffer_size writes, is fsynced once, and is renamed into place only after
+    Content-Length bytes have arrived, so a partial file is never mistaken for a complete one.
+    Dropped connections resume from the end of the .part file with an HTTP Range request, up to retries times.
+    A sidecar filename + '.part.json' keeps the url and ETag (or Last-Modified) of the .part file. A .part file of another url is
+    discarded, and the Range request carries If-Range, so the whole video is sent again if it changed since."""
+    import requests
+    if session is None:
+        session = get_session()
+    part = filename + '.part'
+    for attempt in range(retries + 1):
+        validator = part_validator(part, source_url)
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset > 0 else {}
+        if (offset > 0) and (validator is not None):
+            headers['If-Range'] = validator
+        try:
+            with session.get(source_url, stream = True, timeout = timeout, headers = headers) as r:
+                if (offset > 0) and (r.status_code == 416):
+                    # Nothing left past offset, but the size cannot be checked, so start over
+                    remove_part(part)
+                    continue
+                r.raise_for_status()
+                content_range = r.headers.get('Content-Range', '')
+                if (r.status_code == 206) and (not content_range.startswith(f'bytes {offset}-')):
+                    # Not the range that was asked for, so start over
+                    remove_part(part)
+                    continue
+                if r.status_code != 206:
+                    offset = 0
+                    total = r.headers.get('Content-Length')
+                    start_part(part, source_url, r)
+                else:
+                    total = content_range.rpartition('/')[2]
+                total = int(total) if (total is not None) and total.isdigit() else None
+                with open(part, 'ab' if offset > 0 else 'wb', buffering = buffer_size) as f:
+                    chunks = r.iter_content(chunk_size = buffer_size)
+                    while True:
+                        if budget is not None:
+                            budget.acquire(buffer_size)
+                        try:
+                            chunk = next(chunks, None)
+                            if chunk is None:
+                                break
+                            f.write(chunk)
+                        finally:
+                            if budget is not None:
+                                budget.release(buffer_size)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size = f.tell()
+            if (total is not None) and (size != total):
+                raise IncompleteDownload(f'Got {size} of {total} bytes from {source_url}')
+            os.replace(part, filename)
+            remove_part(part)
+            return filename
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, IncompleteDownload) as e:
+            if attempt == retries:
+                raise
+            print(f'Download interrupted ({e!r}), resuming...')
+    raise IncompleteDownload(f'Could not download {source_url}')
+
+def download_files(jobs, session = None, n_workers = 4, max_inflight_bytes = 16 * 1024 * 1024, timeout = 20, buffer_size = 1024 * 1024):
+    """Downloads (source_url, filename) pairs concurrently over a pooled session, keeping at most max_inflight_bytes in memory.
+    Returns a list with each filename, or the exception raised for it, in the order of jobs."""
+    if session is None:
+        session = get_session()
+    budget = ByteBudget(max_inflight_bytes)
+    output = [None] * len(jobs)
+
+    def work(i):
+        source_url, filename = jobs[i]
+        try:
+            output[i] = download_file(source_url, filename, session, timeout, buffer_size, budget = budget)
+        except Exception as e:
+            output[i] = e
+
+    with ThreadPoolExecutor(max_workers = max(1, n_workers)) as pool:
+        list(pool.map(work, range(len(jobs))))
+    return output
+
+def resolve_play_ids(url, session = None, base_url = None, timeout = 20) -> list:
+    """Takes a search url from get_search_url and returns the play ids of the matching pitches, in results order."""
+    return [row['play_id'] for row in resolve_play_rows(url, session, base_url, timeout)]
+
+def resolve_play_rows(url, session = None, base_url = None, timeout = 20) -> list:
+    """Returns the result rows of a search url, in results order, as dicts with at least a 'play_id'.
+    Requests the same per-player detail rows the search page loads when player_name is clicked.
+    JSON rows keep every field Savant sends; rows parsed from HTML only have the play id."""
+    from bs4 import BeautifulSoup
+    if session is None:
+        session = get_session()
+    if base_url is None:
+        base_url = savant_url
+    query = urlsplit(url).query
+    pitcher = parse_qs(query).get('pitchers_lookup[]', [''])[0]
+    r = session.get(f'{base_url}/statcast_search?{query}&type=details&player_id={pitcher}', timeout = timeout)
+    r.raise_for_status()
+    if 'json' in r.headers.get('Content-Type', ''):
+        return [row for row in r.json() if row.get('play_id')]
+    soup = BeautifulSoup(r.text, 'html.parser')
+    output = []
+    for link in soup.find_all('a', href = True):
+        play_id = parse_qs(urlsplit(link['href']).query).get('playId')
+        if play_id and play_id[0] not in [row['play_id'] for row in output]:
+            output.append({'play_id': play_id[0]})
+    return output
+
+def resolve_video_source(play_id, away = False, session = None, base_url = None, timeout = 20) -> str:
+    """Returns the mp4 url of a play's video page, following the away feed link if away is True."""
+    from bs4 import BeautifulSoup
+    if session is None:
+        session = get_session()
+    if base_url is None:
+        base_url = savant_url
+    r = session.get(f'{base_url}/sporty-videos?playId={play_id}', timeout = timeout)
+    r.raise_for_status()
+    soup = BeautifulSoup(r.text, 'html.parser')
+    if away:
+        link = soup.find(id = 'type_AWAY')
+        if (link is not None) and link.get('href'):
+            r = session.get(urljoin(r.url, link['href']), timeout = timeout)
+            r.raise_for_status()
+            soup = BeautifulSoup(r.text, 'html.parser')
+        else:
+            print('Was unable to find away feed.')
+    return soup.find('video', {'id': 'sporty'}).find('source')['src']
 
+def resolve_source_url(url, away = False, session = None, base_url = None, timeout = 20, pitch = None, searches = None):
+    """Resolves a search url to (play_id, mp4 url) of the result matching pitch (see pick_play) over plain HTTP, without a browser.
+    searches is an optional dict of result rows by search url, so clips that share a search request its results once."""
+    if (searches is not None) and (url in searches):
+        rows = searches[url]
+    else:
+        rows = resolve_play_rows(url, session, base_url, timeout)
+        if searches is not None:
+            searches[url] = rows
+    play_id = pick_play(rows, pitch, url)
+    return play_id, resolve_video_source(play_id, away, session, base_url, timeout)
+
+def get_source_url_selenium(url, driver, away = False, timeout = 20, poll = 0.25, mark = None):
+    """Drives the search page with Selenium to find the mp4 url of the first result.
+    The page does not show the attributes pick_play compares, so clips sharing a search url all get the first result here."""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+    if mark is None:
+        mark = lambda stage: None
     driver.get(url)
-    time.sleep(3)
-    driver.find_element_by_class_name('player_name').click()
-    time.sleep(7)
-    soup = BeautifulSoup(driver.page_source, 'html.parser')
-    driver.get('https://baseballsavant.mlb.com' + soup.find('div', {'id':'search-results'}).find('a')['href'])
+    wait_for(driver, EC.element_to_be_clickable((By.CLASS_NAME, 'player_name')), timeout, poll).click()
+    mark('search')
+    links = wait_for(driver, lambda d: d.find_elements(By.CSS_SELECTOR, '#search-results a[href*="playId="]'), timeout, poll)
+    driver.get(links[0].get_attribute('href'))
+    mark('results')
+    home_source = None
     if away:
         print('Switching to away feed...')
-        time.sleep(7)
         try:
-            driver.find_element(By.ID, 'type_AWAY').click()
-        except:
+            home_source = wait_for(driver, video_source, timeout, poll)
+            wait_for(driver, EC.element_to_be_clickable((By.ID, 'type_AWAY')), timeout, poll).click()
+        except TimeoutException:
             print('Was unable to find away feed.')
-    soup = BeautifulSoup(driver.page_source, 'html.parser')
-    source_url = soup.find('video', {'id':'sporty'}).find('source')['src']
-
-    r = requests.get(source_url, stream = True)
-    if r.ok:
-        with open(filename, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=1024 * 8):
-                if chunk:
-                    f.write(chunk)
-                    f.flush()
-                    os.fsync(f.fileno())
+            home_source = None
+        mark('away')
+    try:
+        source_url = wait_for(driver, lambda d: video_source(d, home_source), timeout, poll)
+    except TimeoutException:
+        if home_source is None:
+            raise
+        print('Away feed did not load, using home feed.')
+        source_url = home_source
+    mark('video')
+    return source_url
+
+def get_vid_from_url(url: str, driver, filename = 'highlight.mp4', away = False, timeout = 20, poll = 0.25, timings = None,
+                     use_http = True, session = None):
+    """Takes in a url as a string and downloads the video, returning the filename. Retrieves first video in results.
+    The video is resolved over plain HTTP first; if that fails and a Selenium driver is given, the browser is used instead.
+    Browser waits return as soon as the page is ready, up to timeout seconds, checking every poll seconds.
+    If a dict is passed as timings, the seconds spent in each stage are stored in it."""
+    return fetch_clip(url, driver, filename, away, timeout, poll, timings, use_http, session)[0]
+
+def fetch_clip(url: str, driver, filename = 'highlight.mp4', away = False, timeout = 20, poll = 0.25, timings = None,
+               use_http = True, session = None, source_url = None, budget = None, pitch = None, searches = None):
+    """Does the work of get_vid_from_url and returns (filename, mp4 url). A known source_url skips resolving the search.
+    budget is an optional ByteBudget shared with other downloads.
+    pitch picks which result of the search to download over HTTP (see pick_play), and searches is passed on to resolve_source_url."""
+    import requests
+    if timings is None:
+        timings = {}
+    if session is None:
+        session = get_session()
+    start = time.perf_counter()
 
-    return filename
+    def mark(stage):
+        nonlocal start
+        now = time.perf_counter()
+        timings[stage] = now - start
+        instrument.record('get_vid.' + stage, start, now, url = url)
+        start = now
+
+    def download(source_url):
+        download_file(source_url, filename, session, timeout, budget = budget)
+        mark('download')
+
+    if source_url is not None:
+        try:
+            download(source_url)
+            return filename, source_url
+        except requests.RequestException as e:
+            print(f'Known video link failed ({e!r}), resolving it again.')
+            source_url = None
+    if use_http:
+        try:
+            source_url = resolve_source_url(url, away, session, timeout = timeout, pitch = pitch, searches = searches)[1]
+            mark('resolve')
+        except NoMatchingPlay:
+            raise
+        except Exception as e:
+            if driver is None:
+                raise
+            print(f'HTTP lookup failed ({e!r}), falling back to Selenium.')
+            mark('resolve')
+    if source_url is None:
+        source_url = get_source_url_selenium(url, driver, away, timeout, poll, mark)
+    download(source_url)
+
+    return filename, source_url
 
 def get_vids_from_urls(urls: list, driver, aways = []):
     """Takes in multiple urls and uses Selenium to download the videos, returning the list of filenames."""
@@ -83,45 +401,241 @@ def get_vids_from_urls(urls: list, driver, aways = []):
     for i, url in enumerate(urls):
         try:
             output.append(get_vid_from_url(url, driver, f'highlight{i}.mp4', aways[i]))
-        except:
-            print('Error processing video for statcast search with url: ' + url)
+        except Exception as e:
+            print(f'Error processing video for statcast search with url: {url} ({e!r})')
     return output
 
-def create_compilation_from_urls(urls, output = 'compilation.mp4', captions = None, countdown = True, aways = [], max_duration = 20, truncate_beginning = True):
-    """Takes in mutliple urls and makes a compilation video. Returns the filename of the compilation."""
-    driver = init_driver()
+def get_vids_parallel(urls: list, aways = [], n_drivers = 4, make_driver = init_driver, timeout = 20, poll = 0.25, timings = None,
+                      use_selenium = True, cache = None, max_inflight_bytes = 16 * 1024 * 1024, on_clip = None, pitches = []):
+    """Downloads the videos for multiple urls with n_drivers workers pulling from a shared queue.
+    Workers resolve clips over plain HTTP and only start a Selenium driver (make_driver) for clips that need the browser fallback.
+    Returns (filenames, failures): filenames keeps the order of urls with None for clips that failed,
+    and failures lists (index, url, exception) for each of them.
+    If a list is passed as timings, it is filled with one dict of stage timings per url (see get_vid_from_url).
+    With a clip_cache.ClipCache, cached clips are returned from the cache and new downloads are added to it.
+    Downloads share a ByteBudget of max_inflight_bytes.
+    on_clip(index, filename) is called from the worker as soon as each clip is done, with filename None if it failed.
+    Clips with the same search url are handled by one worker, which loads the search results once.
+    pitches optionally gives each clip's pitch attributes (see get_pitches), which pick its result when several clips share a search url."""
     if len(aways) == 0:
         aways = [False] * len(urls)
-    filenames = get_vids_from_urls(urls, driver, aways)
-    driver.quit()
-    clips = []
-    for i, filename in enumerate(filenames):
-        time.sleep(0.2)
-        clip = VideoFileClip(filename, fps_source="fps")
-        if truncate_beginning:
-            clip = clip.subclip(2, clip.duration)
-        if clip.duration > max_duration:
-            clip = clip.subclip(0, max_duration)
-        print(f'{filename} framerate: {clip.fps}')
-        if captions != None:
-            text = TextClip(captions[i], font = 'Arial', fontsize = 36, color = 'white').set_position((60, clip.h - 140)).set_duration(clip.duration)
-            print(captions[i])
-            clip = CompositeVideoClip([clip, text])
-        clips.append(clip)
-        os.remove(filename)
+    if len(pitches) == 0:
+        pitches = [None] * len(urls)
+    if timings is not None:
+        timings[:] = [{} for _ in urls]
+    searches = coalesce_searches(urls)
+    jobs = queue.Queue()
+    for search in searches:
+        jobs.put(search)
+    filenames = [None] * len(urls)
+    failures = []
+    lock = threading.Lock()
+    budget = ByteBudget(max_inflight_bytes)
+
+    def worker():
+        # Browsers are only started for clips the HTTP resolver cannot handle
+        driver = None
+
+        def acquire(i, url, results):
+            nonlocal driver
+            clip_timings = {} if timings is None else timings[i]
+            cached = None if cache is None else cache.get(url, aways[i], pitches[i])
+            if cached is not None:
+                instrument.clip(i, url = url, cached = True)
+                return cached
+            source_url = None if cache is None else cache.get_source(url, aways[i], pitches[i])
+            try:
+                filename, source_url = fetch_clip(url, driver, f'highlight{i}.mp4', aways[i], timeout, poll, clip_timings,
+                                                  source_url = source_url, budget = budget, pitch = pitches[i], searches = results)
+            except NoMatchingPlay:
+                raise
+            except Exception as e:
+                if (driver is not None) or (not use_selenium):
+                    raise
+                print(f'HTTP lookup failed ({e!r}), starting a Selenium driver.')
+                with instrument.span('get_vid.init_driver'):
+                    driver = make_driver()
+                filename, source_url = fetch_clip(url, driver, f'highlight{i}.mp4', aways[i], timeout, poll, clip_timings,
+                                                  use_http = False, budget = budget)
+            if instrument.enabled():
+                instrument.clip(i, url = url, cached = False, **clip_metrics(filename, clip_timings))
+            if cache is not None:
+                filename = cache.put(url, aways[i], filename, source_url, pitches[i])
+            return filename
+
+        try:
+            while True:
+                try:
+                    url, clips = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                results = {}
+                for i in clips:
+                    try:
+                        with instrument.span('get_vid.clip', index = i):
+                            filenames[i] = acquire(i, url, results)
+                    except Exception as e:
+                        print(f'Error processing video for statcast search with url: {url} ({e!r})')
+                        with lock:
+                            failures.append((i, url, e))
+                    if on_clip is not None:
+                        on_clip(i, filenames[i])
+        finally:
+            if driver is not None:
+                driver.quit()
+
+    threads = [threading.Thread(target = worker, daemon = True) for _ in range(max(1, min(n_drivers, len(searches))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    failures.sort(key = lambda x: x[0])
+    return filenames, failures
+
+def clip_metrics(filename, timings) -> dict:
+    """Trace metrics for a downloaded clip from its file and the stage timings fetch_clip stored for it:
+    seconds spent finding the video, seconds and bytes downloaded, and the download rate in MB/s."""
+    size = os.path.getsize(filename)
+    download = timings.get('download', 0)
+    output = {'resolve_seconds': sum(seconds for stage, seconds in timings.items() if stage != 'download'),
+              'download_seconds': download, 'bytes': size}
+    if download > 0:
+        output['download_mbps'] = size / 1e6 / download
+    return output
+
+def print_stage_timings(timings):
+    """Prints the total and mean seconds spent in each scraping stage over a list of per-clip timing dicts."""
+    stages = {}
+    for clip in timings:
+        for stage, seconds in clip.items():
+            stages.setdefault(stage, []).append(seconds)
+    for stage, values in stages.items():
+        print(f'{stage}: {sum(values):.1f}s total, {sum(values) / len(values):.2f}s per clip')
+
+def create_compilation_from_urls(urls, output = 'compilation.mp4', captions = None, countdown = True, aways = [], max_duration = 20, truncate_beginning = True,
+                                 n_drivers = 4, clip_cache = None, pipelined = True, n_encoders = None, queue_size = 4, pitches = []):
+    """Takes in mutliple urls and makes a compilation video. Returns the filename of the compilation.
+    Clips are fetched by n_drivers workers in parallel; clips that fail are skipped and listed at the end.
+    Pass a clip_cache.ClipCache to reuse clips downloaded for earlier reels.
+    With pipelined, each clip is trimmed, captioned and encoded to its own segment by a pool of n_encoders processes (one per core by default)
+    as soon as it is downloaded, and the segments are joined at the end without re-encoding.
+    At most queue_size downloaded clips wait for an encoder before downloads pause.
+    Otherwise every clip is downloaded before any is edited, and the whole compilation is encoded in one pass.
+    pitches is passed on to get_vids_parallel."""
+    from render import prepare_clip, join_segments, join_clips
+    timings = []
+    if clip_cache is not None:
+        since = (clip_cache.hits, clip_cache.misses)
+    if pipelined:
+        with instrument.span('get_vid.render_pipelined'):
+            filenames, failures = render_pipelined(urls, captions, aways, max_duration, truncate_beginning, n_drivers, clip_cache,
+                                                   n_encoders, queue_size, timings, pitches = pitches)
+    else:
+        with instrument.span('get_vid.get_vids_parallel'):
+            filenames, failures = get_vids_parallel(urls, aways, n_drivers, timings = timings, cache = clip_cache, pitches = pitches)
+    print_stage_timings(timings)
+    if clip_cache is not None:
+        print(clip_cache.report(since))
+    if len(failures) > 0:
+        print(f'Failed to get {len(failures)} of {len(urls)} clips:')
+        for i, url, e in failures:
+            print(f'  {i + 1}) {url}')
+    order = [i for i, filename in enumerate(filenames) if filename is not None]
     if countdown:
         print('flipping highlight order')
-        newclips = []
-        for clip in clips[::-1]:
-            newclips.append(clip)
-        clips = newclips
-    compilation = concatenate_videoclips(clips, method = 'compose')
-    compilation.write_videofile(output)
+        order = order[::-1]
+    if pipelined:
+        segments = [filenames[i] for i in order]
+        with instrument.span('render.join_segments', segments = len(segments)):
+            join_segments(segments, output)
+        for segment in segments:
+            os.remove(segment)
+        return output
+    clips = []
+    for i in order:
+        time.sleep(0.2)
+        with instrument.span('render.prepare_clip', index = i):
+            clips.append(prepare_clip(filenames[i], None if captions is None else captions[i], max_duration, truncate_beginning))
+    with instrument.span('render.join_clips', video_seconds = sum(clip.duration for clip in clips)):
+        join_clips(clips, output)
+    if clip_cache is None:
+        for i in order:
+            os.remove(filenames[i])
     return output
 
-def create_compilation_from_args(args, output = 'compilation.mp4', captions = None, countdown = True, teams = [], players = [], max_duration = 20, truncate_beginning = True):
+def render_pipelined(urls, captions = None, aways = [], max_duration = 20, truncate_beginning = True, n_drivers = 4, clip_cache = None,
+                     n_encoders = None, queue_size = 4, timings = None, segment_names = None, pitches = []):
+    """Downloads clips and encodes each into a segment file while the rest are still downloading.
+    Downloaded clips go through a queue of at most queue_size to a pool of n_encoders encoder processes, so slow encoding holds back the downloads.
+    Segments are written to segment_names, one filename per url, or segment0.mp4, segment1.mp4... by default.
+    Returns (segments, failures) like get_vids_parallel, with the segment filename in place of each downloaded clip."""
+    from render import render_segment, encoder_pool, probe_clip, segment_fps
+    ready = queue.Queue(maxsize = queue_size)
+    segments = [None] * len(urls)
+    failures = []
+    lock = threading.Lock()
+    n_encoders = n_encoders or os.cpu_count()
+    if segment_names is None:
+        segment_names = [f'segment{i}.mp4' for i in range(len(urls))]
+    pool = encoder_pool(n_encoders)
+
+    def encoder():
+        while True:
+            item = ready.get()
+            if item is None:
+                return
+            i, filename = item
+            try:
+                start = time.perf_counter()
+                segments[i] = pool.submit(render_segment, filename, segment_names[i], None if captions is None else captions[i],
+                                          max_duration, truncate_beginning).result()
+                if instrument.enabled():
+                    end = time.perf_counter()
+                    instrument.record('render.segment', start, end, index = i)
+                    instrument.clip(i, encode_seconds = end - start, encode_fps = probe_clip(segments[i])['duration'] * segment_fps / (end - start))
+            except Exception as e:
+                print(f'Error rendering video for statcast search with url: {urls[i]} ({e!r})')
+                with lock:
+                    failures.append((i, urls[i], e))
+            finally:
+                # An encoder that dies would leave downloads blocked on a full queue
+                if clip_cache is None:
+                    try:
+                        os.remove(filename)
+                    except OSError as e:
+                        print(f'Could not remove {filename} ({e!r})')
+
+    def on_clip(i, filename):
+        if filename is not None:
+            ready.put((i, filename))
+
+    threads = [threading.Thread(target = encoder, daemon = True) for _ in range(max(1, n_encoders))]
+    for thread in threads:
+        thread.start()
+    try:
+        _, download_failures = get_vids_parallel(urls, aways, n_drivers, timings = timings, cache = clip_cache, on_clip = on_clip,
+                                                 pitches = pitches)
+    finally:
+        for _ in threads:
+            ready.put(None)
+        for thread in threads:
+            thread.join()
+        pool.shutdown()
+    failures = sorted(download_failures + failures, key = lambda x: x[0])
+    return segments, failures
+
+@instrument.traced('get_vid.create_compilation_from_args')
+def create_compilation_from_args(args, output = 'compilation.mp4', captions = None, countdown = True, teams = [], players = [], max_duration = 20, truncate_beginning = True,
+                                 n_drivers = 4, clip_cache = None, pipelined = True, n_encoders = None):
     """Takes in a list of arg dictionaries and creates a compilation video. Returns the filename of the compilation."""
     urls = get_search_urls(args)
+    aways = get_aways(args, teams, players)
+    return create_compilation_from_urls(urls, output, captions, countdown, aways, max_duration = max_duration,
+                                        truncate_beginning = truncate_beginning, n_drivers = n_drivers, clip_cache = clip_cache,
+                                        pipelined = pipelined, n_encoders = n_encoders, pitches = get_pitches(args))
+
+def get_aways(args, teams = [], players = []) -> list:
+    """Picks the feed for each clip when filtering for teams or players: True for the away broadcast. Empty when there is no filter."""
     aways = []
     if len(teams) + len(players) > 0:
         for arg in args:
@@ -141,8 +655,4 @@ def create_compilation_from_args(args, output = 'compilation.mp4', captions = No
                         aways.append(True)
                     else:
                         aways.append(False)
-
-
-
-    return create_compilation_from_urls(urls, output, captions, countdown, aways, max_duration = max_duration,
-                                        truncate_beginning = truncate_beginning)
+    return aways
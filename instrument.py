@@ -0,0 +1,205 @@
+# Timed spans and per-clip metrics for a highlight reel run, exported as a JSON trace
+# Nothing is recorded unless a Tracer has been started, and then span() is a single global check returning a shared no-op context
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+tracer = None
+
+class Tracer:
+    """Collects timed spans from every thread and one dict of metrics per clip.
+    With profile set to a span name, spans of that name run under cProfile one at a time; one that opens while another is profiled is only timed.
+    Spans that run in encoder processes are timed from the thread that waits for them."""
+
+    def __init__(self, profile = None):
+        self.spans = []
+        self.clips = {}
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.profile = profile
+        self.profiler = cProfile.Profile() if profile is not None else None
+        self.profiling = False
+
+    def span(self, name, **attrs):
+        return Span(self, name, attrs)
+
+    def add_span(self, name, start, end, attrs):
+        with self.lock:
+            self.spans.append({'name': name, 'start': start - self.origin, 'duration': end - start,
+                               'thread': threading.current_thread().name, 'attrs': attrs})
+
+    def clip(self, index, **metrics):
+        """Adds metrics to the record of clip index, the position of its url in the reel."""
+        with self.lock:
+            self.clips.setdefault(index, {'index': index}).update(metrics)
+
+    def start_profile(self, name) -> bool:
+        if name != self.profile:
+            return False
+        with self.lock:
+            if self.profiling:
+                return False
+            self.profiling = True
+        self.profiler.enable()
+        return True
+
+    def stop_profile(self):
+        self.profiler.disable()
+        with self.lock:
+            self.profiling = False
+
+    def stages(self) -> dict:
+        """Returns {span name: (count, total seconds)}, in the order each name first appeared."""
+        output = {}
+        for span in self.spans:
+            count, total = output.get(span['name'], (0, 0.0))
+            output[span['name']] = (count + 1, total + span['duration'])
+        return output
+
+    def print_summary(self):
+        """Prints the count and total seconds of each span name, then the per-clip download and encode rates."""
+        for name, (count, total) in self.stages().items():
+            print(f'{name}: {count}x, {total:.2f}s total')
+        for index, clip in sorted(self.clips.items()):
+            rates = []
+            if 'download_mbps' in clip:
+                rates.append(f"{clip['bytes'] / 1e6:.2f} MB at {clip['download_mbps']:.1f} MB/s")
+            if 'encode_fps' in clip:
+                rates.append(f"encoded at {clip['encode_fps']:.0f} fps")
+            if len(rates) > 0:
+                print(f'  clip {index + 1}: ' + ', '.join(rates))
+
+    def profile_stats(self, n = 25) -> str:
+        """The n most expensive calls of the profiled stage, by cumulative time."""
+        output = io.StringIO()
+        pstats.Stats(self.profiler, stream = output).sort_stats('cumulative').print_stats(n)
+        return output.getvalue()
+
+    def to_dict(self) -> dict:
+        """The trace in Chrome trace event format, so it opens in chrome://tracing or Perfetto, with the clip metrics under 'clips'."""
+        threads = {}
+        events = []
+        for span in self.spans:
+            tid = threads.setdefault(span['thread'], len(threads))
+            events.append({'name': span['name'], 'ph': 'X', 'ts': round(span['start'] * 1e6), 'dur': round(span['duration'] * 1e6),
+                           'pid': os.getpid(), 'tid': tid, 'args': span['attrs']})
+        for name, tid in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}})
+        return {'traceEvents': events, 'clips': [clip for _, clip in sorted(self.clips.items())], 'profile': self.profile}
+
+    def save(self, path):
+        """Writes the JSON trace to path. When a stage was profiled, its stats are dumped next to it as path + '.prof'."""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, default = str)
+        if self.profiler is not None:
+            self.profiler.dump_stats(path + '.prof')
+        return path
+
+class Span:
+    """Context manager that records one span in a Tracer. set(...) adds attributes while it is open."""
+    __slots__ = ('tracer', 'name', 'attrs', 'start', 'profiled')
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.profiled = self.tracer.start_profile(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        if self.profiled:
+            self.tracer.stop_profile()
+        if exc[0] is not None:
+            self.attrs['error'] = repr(exc[1])
+        self.tracer.add_span(self.name, self.start, end, self.attrs)
+        return False
+
+class NoSpan:
+    """Stand-in for Span while tracing is off. One instance is shared by every untraced block."""
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+no_span = NoSpan()
+
+def start(profile = None) -> Tracer:
+    """Starts recording spans and clip metrics in a new Tracer and returns it. Pass a span name as profile to run that stage under cProfile."""
+    global tracer
+    tracer = Tracer(profile)
+    return tracer
+
+def stop() -> Tracer:
+    """Stops recording and returns the Tracer that was active, or None."""
+    global tracer
+    output, tracer = tracer, None
+    return output
+
+def enabled() -> bool:
+    return tracer is not None
+
+def span(name, **attrs):
+    """Context manager timing the block under name while a Tracer is active; a shared no-op otherwise.
+    Entering it gives an object whose set(...) adds attributes to the span."""
+    if tracer is None:
+        return no_span
+    return tracer.span(name, **attrs)
+
+def record(name, start, end, **attrs):
+    """Records a span that was timed elsewhere, from two time.perf_counter() readings, while a Tracer is active."""
+    if tracer is not None:
+        tracer.add_span(name, start, end, attrs)
+
+def clip(index, **metrics):
+    """Records metrics for clip index while a Tracer is active."""
+    if tracer is not None:
+        tracer.clip(index, **metrics)
+
+def traced(name):
+    """Decorator that wraps every call of a function in span(name)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if tracer is None:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def tracing(path = None, profile = None):
+    """Traces the block when path or profile is given: prints a summary of the stages afterwards, saves the JSON trace to path
+    and prints the profile of the stage named profile. With neither, the block runs untraced, or joins a Tracer that is already active."""
+    if (path is None) and (profile is None):
+        yield tracer
+        return
+    active = start(profile)
+    try:
+        yield active
+    finally:
+        stop()
+        active.print_summary()
+        if path is not None:
+            active.save(path)
+        if profile is not None:
+            print(active.profile_stats())
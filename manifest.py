@@ -0,0 +1,26 @@
+# JSON manifest shared by the on-disk stores of statcast days and daily reel videos
+import datetime
+import json
+import os
+
+class Manifest:
+    """Mixin for classes that keep their state in a JSON file at self.manifest_path and track game dates that are only
+    final settle_days after they were played. Subclasses set empty_manifest to build the manifest used before the first save."""
+    empty_manifest = dict
+
+    def load_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return self.empty_manifest()
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def save_manifest(self):
+        """Writes the manifest atomically so an interrupted run never leaves it half written."""
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent = 1, sort_keys = True, default = str)
+        os.replace(tmp, self.manifest_path)
+
+    def is_final(self, date) -> bool:
+        """Whether data for game_date date can no longer change, settle_days after it was played."""
+        return datetime.date.fromisoformat(date) <= datetime.date.today() - datetime.timedelta(days = self.settle_days)
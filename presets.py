@@ -1,116 +1,342 @@
-import get_vid
+import os
 import pyb_tools
+import instrument
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 def make_highlight_reel(start_date, end_date, n_highlights, format, daily = False, teams = [], players = [],
-                        ascending = False, max_duration = 20, countdown = True, truncate_beginning = True):
+                        ascending = False, max_duration = 20, countdown = True, truncate_beginning = True, store = None, clip_cache = None,
+                        pipelined = True, trace = None, profile = None, daily_reel = None):
     """Creates a highlight reel from start_date to end_date of n_highlights clips based on the preset format.
-     Set daily to true to pick n_highlights per day. Teams and players can be filtered for. Ascending = True will provide the lowest values instead of the highest."""
-    df = make_leaderboard(start_date, end_date, n_highlights, format, daily, teams, players, ascending)
-    df['flavor'] = df[preset_dict[format]['flavor_columns']].apply(preset_dict[format]['flavor_func'], axis = 1)
-    args = pyb_tools.get_search_args_list(df)
-    captions = pyb_tools.generate_captions(args, list(df['flavor']))
+     Set daily to true to pick n_highlights per day. Teams and players can be filtered for. Ascending = True will provide the lowest values instead of the highest.
+     Set trace to a filename to time every stage of the run and save the spans and per-clip metrics there as JSON (see instrument.tracing).
+     Set profile to a stage name, such as 'presets.tool' or 'get_vid.clip', to run that stage under cProfile.
+     With daily, pass a daily_reel.DailyReel as daily_reel to only compute and render the days that are new or changed since its last run (see make_daily_reel)."""
+    if daily_reel is not None:
+        if not daily:
+            raise ValueError('daily_reel needs daily = True')
+        with instrument.tracing(trace, profile):
+            return make_daily_reel(daily_reel, start_date, end_date, n_highlights, format, teams, players, ascending, max_duration, countdown,
+                                   truncate_beginning, store, clip_cache)
+    with instrument.tracing(trace, profile), instrument.span('presets.make_highlight_reel', format = format):
+        df = make_leaderboard(start_date, end_date, n_highlights, format, daily, teams, players, ascending, store)
+        with instrument.span('presets.flavor'):
+            df['flavor'] = df[preset_dict[format]['flavor_columns']].apply(preset_dict[format]['flavor_func'], axis = 1)
+        args = pyb_tools.get_search_args_list(df)
+        captions = pyb_tools.generate_captions(args, list(df['flavor']))
+        for caption in captions:
+            print(caption)
+        # Only reels need the scraping and video stack, so leaderboard-only use never imports it
+        import get_vid
+        compilation = get_vid.create_compilation_from_args(args, captions = captions, teams = teams, players = players, max_duration = max_duration, countdown = countdown, truncate_beginning = truncate_beginning,
+                                                           clip_cache = clip_cache, pipelined = pipelined)
+    return compilation
+
+@instrument.traced('presets.make_daily_reel')
+def make_daily_reel(reel, start_date, end_date, n_highlights, format, teams = [], players = [], ascending = False, max_duration = 20,
+                    countdown = True, truncate_beginning = True, store = None, clip_cache = None, output = 'compilation.mp4'):
+    """Builds the daily highlight reel of make_highlight_reel(daily = True) incrementally, keeping its state in reel, a daily_reel.DailyReel.
+     Leaderboard rows are only computed for days reel has not seen or whose data may have changed (see DailyReel.stale_dates).
+     Only days whose rows or caption numbers changed are rendered, each into one video of segments joined without re-encoding,
+     and the compilation is joined from the day videos the same way, so earlier days are never encoded again.
+     Returns the filename of the compilation, which matches a full rebuild clip for clip, or None if no day in the range has a clip."""
+    import get_vid
+    from render import join_segments
+    reel.use_settings({'n_highlights': n_highlights, 'format': format, 'teams': teams, 'players': players, 'ascending': ascending,
+                       'max_duration': max_duration, 'countdown': countdown, 'truncate_beginning': truncate_beginning})
+    dates = [d.strftime('%Y-%m-%d') for d in pd.date_range(start_date, end_date)]
+    if store is not None:
+        store.fetch(start_date, end_date)
+    stale = reel.stale_dates(dates, store)
+    for run_start, run_end in pyb_tools.date_runs(stale):
+        rows = daily_rows(run_start, run_end, n_highlights, format, teams, players, ascending, store)
+        for date in pd.date_range(run_start, run_end).strftime('%Y-%m-%d'):
+            reel.set_rows(date, rows.get(date, []), None if store is None else store.manifest.get(date, {}).get('hash'))
+    reel.number(dates)
+    reel.save_manifest()
+    render = reel.dates_to_render()
+    print(f'Daily reel: {len(stale)} of {len(dates)} days computed, {len(render)} rendered')
+    args, captions, segment_names, clips = [], [], [], {}
+    for date in render:
+        day = reel.days[date]
+        clips[date] = range(len(args), len(args) + len(day['rows']))
+        args += day['rows']
+        captions += pyb_tools.generate_captions(day['rows'], [row['flavor'] for row in day['rows']], first = day['first'])
+        segment_names += [reel.segment_path(date, k) for k in range(len(day['rows']))]
     for caption in captions:
         print(caption)
-    compilation = get_vid.create_compilation_from_args(args, captions = captions, teams = teams, players = players, max_duration = max_duration, countdown = countdown, truncate_beginning = truncate_beginning)
-    return compilation
+    if len(args) > 0:
+        segments, failures = get_vid.render_pipelined(get_vid.get_search_urls(args), captions, get_vid.get_aways(args, teams, players),
+                                                      max_duration, truncate_beginning, clip_cache = clip_cache, segment_names = segment_names,
+                                                      pitches = get_vid.get_pitches(args))
+        for i, url, e in failures:
+            print(f'  Failed {i + 1}) {url}')
+        for date in render:
+            day_segments = [segments[i] for i in clips[date] if segments[i] is not None]
+            if countdown:
+                day_segments = day_segments[::-1]
+            if len(day_segments) > 0:
+                join_segments(day_segments, reel.day_path(date))
+            elif os.path.exists(reel.day_path(date)):
+                os.remove(reel.day_path(date))
+            for segment in day_segments:
+                os.remove(segment)
+            reel.set_rendered(date, len(clips[date]) - len(day_segments))
+        reel.save_manifest()
+    videos = reel.videos(countdown)
+    if len(videos) == 0:
+        print(f'No clips from {start_date} to {end_date}, no compilation made.')
+        return None
+    with instrument.span('render.join_segments'):
+        return join_segments(videos, output)
+
+def daily_rows(start_date, end_date, n_highlights, format, teams = [], players = [], ascending = False, store = None) -> dict:
+    """Computes the daily leaderboard of start_date..end_date and returns {date: [search args with a 'flavor' key, ...]} for the days with rows.
+     With a store, only days already in it are read."""
+    if store is None:
+        df = get_leaderboard_data(start_date, end_date, None, [format])
+    else:
+        df = store.read(start_date, end_date, preset_columns([format]), fetch = False)
+        if len(df) == 0:
+            return {}
+        df = prepare_leaderboard_data(df, [format])
+    df = leaderboard_from_data(df, n_highlights, format, True, teams, players, ascending)
+    if len(df) == 0:
+        return {}
+    df['flavor'] = df[preset_dict[format]['flavor_columns']].apply(preset_dict[format]['flavor_func'], axis = 1)
+    output = {}
+    for args, flavor in zip(pyb_tools.get_search_args_list(df), df['flavor']):
+        args['flavor'] = flavor
+        output.setdefault(args['date'], []).append(args)
+    return output
 
+@instrument.traced('presets.make_leaderboard')
 def make_leaderboard(start_date, end_date, n_highlights, format, daily = False, teams = [], players = [],
-                     ascending = False):
+                     ascending = False, store = None, compact = True, chunk_days = None, n_workers = None):
     """Creates a dataframe leaderboard from start_date to end_date of n_highlights entries based on the preset format.
-     Set daily to true to pick n_highlights per day. Teams and players can be filtered for. Ascending = True will provide the lowest values instead of the highest."""
-    pyb_tools.pybaseball.cache.enable()
-    df = pyb_tools.get_statcast_data(start_date, end_date)
-    df = pyb_tools.determine_pitching_batting_team(df)
-    # Next line calls a function from a dict
-    df = preset_dict[format]['tool'](df, teams, players)
-    df = df.sort_values(by = preset_dict[format]['flavor_columns'], ascending = ascending)
+     Set daily to true to pick n_highlights per day. Teams and players can be filtered for. Ascending = True will provide the lowest values instead of the highest.
+     Pass a statcast_store.StatcastStore as store to reuse previously downloaded days.
+     With compact = True only the columns the preset needs are kept, in memory-compact dtypes.
+     Set chunk_days to read and rank the data chunk_days days at a time, so memory no longer grows with the date range (see stream_leaderboards).
+     Set n_workers to rank shards of chunk_days days (7 by default) in that many processes (see parallel_leaderboards)."""
+    jobs = {format: (n_highlights, format, daily, teams, players, ascending)}
+    if n_workers is not None:
+        return parallel_leaderboards(start_date, end_date, chunk_days or 7, jobs, store, [format] if compact else None, n_workers)[format]
+    if chunk_days is not None:
+        return stream_leaderboards(start_date, end_date, chunk_days, jobs, store, [format] if compact else None)[format]
+    df = get_leaderboard_data(start_date, end_date, store, [format] if compact else None)
+    return leaderboard_from_data(df, n_highlights, format, daily, teams, players, ascending)
+
+@instrument.traced('presets.make_leaderboards')
+def make_leaderboards(start_date, end_date, n_highlights, formats = [], teams = [], daily = False, players = [],
+                      ascending = False, store = None, compact = True, chunk_days = None, n_workers = None):
+    """Creates every requested leaderboard from a single pull of statcast data and a single derived-feature pass.
+     Returns a dict keyed by (format, team); team is None for league-wide leaderboards when no teams are given.
+     Formats defaults to every preset in preset_dict. chunk_days works as in make_leaderboard.
+     With n_workers, the range is split into shards of chunk_days days (7 by default) that are ranked by a pool of n_workers processes
+     (see parallel_leaderboards)."""
+    if len(formats) == 0:
+        formats = list(preset_dict)
+    jobs = {}
+    for format in formats:
+        if len(teams) == 0:
+            jobs[(format, None)] = (n_highlights, format, daily, [], players, ascending)
+        for team in teams:
+            jobs[(format, team)] = (n_highlights, format, daily, [team], players, ascending)
+    if n_workers is not None:
+        return parallel_leaderboards(start_date, end_date, chunk_days or 7, jobs, store, formats if compact else None, n_workers)
+    if chunk_days is not None:
+        return stream_leaderboards(start_date, end_date, chunk_days, jobs, store, formats if compact else None)
+    df = get_leaderboard_data(start_date, end_date, store, formats if compact else None)
+    return chunk_leaderboards(df, jobs)[1]
+
+def stream_leaderboards(start_date, end_date, chunk_days, jobs, store = None, formats = None) -> dict:
+    """Builds leaderboards chunk_days days of data at a time, newest chunk first like the rows of a full pull.
+     jobs maps each key to the (n_highlights, format, daily, teams, players, ascending) arguments of leaderboard_from_data.
+     Only the running top n rows (top n per day when daily) of each leaderboard are kept between chunks, and they are
+     re-ranked with the same stable sort, so the result matches building the leaderboard from the whole range at once."""
+    leaders = {key: None for key in jobs}
+    offset = 0
+    for chunk_start, chunk_end in pyb_tools.date_chunks(start_date, end_date, chunk_days):
+        df = get_leaderboard_data(chunk_start, chunk_end, store, formats)
+        offset = merge_leaderboards(leaders, chunk_leaderboards(df, jobs), offset, jobs)
+        del df
+    return leaders
+
+@instrument.traced('presets.parallel_leaderboards')
+def parallel_leaderboards(start_date, end_date, shard_days, jobs, store = None, formats = None, n_workers = None) -> dict:
+    """Builds leaderboards like stream_leaderboards, with shards of shard_days days ranked in parallel by n_workers processes.
+     Missing days are fetched into the store first and each worker reads its own shard from disk, so no frame is sent between processes.
+     Shard results are merged in date order whatever order they finish in, so the result matches the serial path."""
+    if store is not None:
+        store.fetch(start_date, end_date)
+    shards = pyb_tools.date_chunks(start_date, end_date, shard_days)
+    leaders = {key: None for key in jobs}
+    offset = 0
+    with ProcessPoolExecutor(max_workers = n_workers) as pool:
+        results = pool.map(shard_leaderboards, [first for first, _ in shards], [last for _, last in shards],
+                           repeat(jobs), repeat(store), repeat(formats))
+        for result in results:
+            offset = merge_leaderboards(leaders, result, offset, jobs)
+    return leaders
+
+def shard_leaderboards(start_date, end_date, jobs, store = None, formats = None):
+    """Worker for parallel_leaderboards: loads one shard and returns chunk_leaderboards for it."""
+    if store is None:
+        df = get_leaderboard_data(start_date, end_date, None, formats)
+    else:
+        df = prepare_leaderboard_data(store.read(start_date, end_date, None if formats is None else preset_columns(formats), fetch = False), formats)
+    return chunk_leaderboards(df, jobs)
+
+@instrument.traced('presets.chunk_leaderboards')
+def chunk_leaderboards(df, jobs):
+    """Returns (number of rows in df, {key: leaderboard}) for one chunk of data, sharing one GroupIndex between the leaderboards."""
+    index = pyb_tools.GroupIndex(df)
+    return len(df), {key: leaderboard_from_data(df, *job, index = index) for key, job in jobs.items()}
+
+def merge_leaderboards(leaders, chunk, offset, jobs) -> int:
+    """Folds the output of chunk_leaderboards into the running leaderboards and returns the row offset of the next chunk.
+     The chunk's rows are renumbered as they would be in the full pull, so ties and the index match it too."""
+    rows, results = chunk
+    for key, job in jobs.items():
+        result = results[key]
+        result.index = result.index + offset
+        if leaders[key] is not None:
+            n_highlights, format, daily, teams, players, ascending = job
+            result = rank_leaderboard(pd.concat([leaders[key], result]), n_highlights, format, daily, ascending)
+        leaders[key] = result
+    return offset + rows
+
+@instrument.traced('presets.get_leaderboard_data')
+def get_leaderboard_data(start_date, end_date, store = None, formats = None):
+    """Pulls statcast data and computes the derived columns shared by every preset.
+    If formats are given, only the columns those presets need are loaded and the frame is compacted with pyb_tools.compact_statcast."""
+    if store is None:
+        pyb_tools.enable_cache()
+    if formats is None:
+        df = pyb_tools.get_statcast_data(start_date, end_date, store)
+    else:
+        df = pyb_tools.get_statcast_data(start_date, end_date, store, preset_columns(formats))
+    return prepare_leaderboard_data(df, formats)
+
+def prepare_leaderboard_data(df, formats = None):
+    """Compacts a pulled frame when formats are given and adds the derived columns."""
+    if formats is not None:
+        df = pyb_tools.compact_statcast(df)
+    return pyb_tools.derive_features(df)
+
+def preset_columns(formats) -> list:
+    """Lists the raw statcast columns needed to build leaderboards and highlight reels for the given presets."""
+    output = list(pyb_tools.search_columns)
+    for format in formats:
+        for col in preset_dict[format]['columns']:
+            if col not in output:
+                output.append(col)
+    return output
+
+def leaderboard_from_data(df, n_highlights, format, daily = False, teams = [], players = [], ascending = False, index = None):
+    """Creates a leaderboard from an already loaded statcast dataframe. Only the derived columns are ever added to df, so one frame can be reused across presets.
+    Rows involving the teams or players are picked before the preset runs, using index (a pyb_tools.GroupIndex of df) when given."""
+    df = pyb_tools.derive_features(df)
     if len(teams) + len(players) > 0:
         if len(teams) > 0:
-            home = 'home_team'
-            away = 'away_team'
-            group = teams
+            rows = pyb_tools.group_rows(df, ['home_team', 'away_team'], teams, index)
         else:
-            home = 'pitcher'
-            away = 'batter'
-            group = players
-        df['filter'] = df[[home, away]].apply(pyb_tools.cols_in_group, axis = 1, group = group)
-        df = df.loc[df['filter']]
-    
+            rows = pyb_tools.group_rows(df, ['pitcher', 'batter'], players, index)
+        # Preset tools only filter and score rows one at a time, so narrowing first gives the same rows in the same order
+        df = df.take(rows)
+    # Next line calls a function from a dict
+    with instrument.span('presets.tool', format = format):
+        df = preset_dict[format]['tool'](df, teams, players)
+    if len(teams) + len(players) > 0:
+        df['filter'] = True
 
+    with instrument.span('presets.rank', format = format):
+        return rank_leaderboard(df, n_highlights, format, daily, ascending)
 
+def rank_leaderboard(df, n_highlights, format, daily = False, ascending = False):
+    """Keeps the top n_highlights rows, or the top n_highlights of each day when daily, ranked by the preset's flavor columns."""
     if daily:
-        df_replacement = pyb_tools.pd.DataFrame(columns = df.columns)
-        for date in df['game_date'].unique():
-            df_temp = df.loc[df['game_date'] == date].head(n_highlights)
-            df_replacement = pyb_tools.pd.concat([df_replacement, df_temp])
-        df = df_replacement.sort_values(by = 'game_date', ascending = True)
-    else:
-        df = df.head(n_highlights)
-    return df
+        return pyb_tools.daily_top_n(df, preset_dict[format]['flavor_columns'], n_highlights, ascending)
+    return pyb_tools.top_n(df, preset_dict[format]['flavor_columns'], n_highlights, ascending)
 
 preset_dict = {}
 preset_dict['ump_show'] = {'tool': pyb_tools.ump_show,
+                           'columns': pyb_tools.zone_columns,
                            'flavor_columns': ['miss_by'],
                            'flavor_func': pyb_tools.ump_show_flavor,
                            'description': 'Umps calling strike 3 on pitches outside the strike zone.'}
 
 preset_dict['called_corners'] = {'tool': pyb_tools.called_corners,
+                                 'columns': pyb_tools.zone_columns,
                                  'flavor_columns': ['off_center'],
                                  'flavor_func': lambda x: '',
                                  'description': 'Umps calling strikes on pitches that barely catch the strike zone.'}
 
 preset_dict['clutch'] = {'tool': pyb_tools.clutch,
+                         'columns': ['delta_home_win_exp'],
                          'flavor_columns': ['delta_win_exp'],
                          'flavor_func': pyb_tools.clutch_flavor,
                          'description': 'Plate appearances with the highest change in WPA.'}
 
 preset_dict['blind_umps'] = {'tool': pyb_tools.worst_called_balls,
+                             'columns': pyb_tools.zone_columns,
                              'flavor_columns': ['off_center'],
                              'flavor_func': lambda x: '',
                              'description': 'Umps calling pitches close to the center of the strike zone balls'}
 
 preset_dict['takes_of_steel'] = {'tool': pyb_tools.takes_of_steel,
+                                 'columns': pyb_tools.zone_columns,
                                  'flavor_columns': ['off_center'],
                                  'flavor_func': lambda x: '',
                                  'description': 'Batters taking close pitches with 2 strikes.'}
 
 preset_dict['scorchers'] = {'tool': pyb_tools.scorchers,
+                            'columns': ['launch_speed', 'launch_angle'],
                             'flavor_columns': ['launch_speed', 'launch_angle'],
                             'flavor_func': pyb_tools.batted_ball_flavor,
                             'description': 'High exit velo contact with positive launch angle.'}
 
 preset_dict['undergrounders'] = {'tool': pyb_tools.undergrounders,
+                            'columns': ['launch_speed', 'launch_angle'],
                             'flavor_columns': ['launch_speed', 'launch_angle'],
                             'flavor_func': pyb_tools.batted_ball_flavor,
                             'description': 'High exit velo contact with launch angles below -10.'}
 
 preset_dict['walks'] = {'tool': pyb_tools.walks,
+                        'columns': pyb_tools.zone_columns,
                         'flavor_columns': ['miss_by'],
                         'flavor_func': pyb_tools.ump_show_flavor,
                         'description': 'Walks sorted by how much the pitch misses by.'}
 
 preset_dict['full_count_walks'] = {'tool': pyb_tools.full_count_walks,
+                        'columns': pyb_tools.zone_columns,
                         'flavor_columns': ['miss_by'],
                         'flavor_func': pyb_tools.ump_show_flavor,
                         'description': 'Walks on full counts sorted by how much the pitch misses by.'}
 
 preset_dict['big_fly'] = {'tool': pyb_tools.hit_distance,
+                          'columns': ['hit_distance_sc', 'launch_speed', 'launch_angle'],
                           'flavor_columns': ['hit_distance_sc', 'launch_speed', 'launch_angle'],
                           'flavor_func': pyb_tools.home_run_flavor,
                           'description': 'Longest struck home runs.'}
 
 preset_dict['bad_swings'] = {'tool': pyb_tools.bad_swings,
+                             'columns': pyb_tools.zone_columns + ['events'],
                              'flavor_columns': ['off_edge'],
                              'flavor_func': pyb_tools.ump_show_flavor,
                              'description': 'Swings and misses on pitches outside the strike zone.'}
 
 preset_dict['worst_called_strikes'] = { 'tool': pyb_tools.worst_called_strikes,
+                                        'columns': pyb_tools.zone_columns,
                                         'flavor_columns': ['miss_by'],
                                         'flavor_func': pyb_tools.ump_show_flavor,
                                         'description': 'Umps calling strikes on pitches outside the strike zone.'}
 
 
 preset_dict['chasing_hits'] = { 'tool': pyb_tools.chasing_hits,
+                                        'columns': pyb_tools.zone_columns + ['events'],
                                         'flavor_columns': ['miss_by'],
                                         'flavor_func': pyb_tools.ump_show_flavor,
                                         'description': 'Batters getting hits on pitches outside the strike zone.'}
@@ -1,13 +1,79 @@
 # Additional tools to work with pybaseball
-import pybaseball
+# pybaseball is imported where it is used: it takes seconds to import and leaderboards read from a store never need it
 import datetime
+import json
+import os
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-
-def get_statcast_data(start_date = '2023-03-30', end_date = (datetime.date.today() - datetime.timedelta(days = 2)).__str__()) -> pd.DataFrame:
-    """Pulls statcast data for the specified timeframe and returns it as a pd.DataFrame. Dates default to the beginning of the 2023 season to yesterday."""
+import instrument
+
+@instrument.traced('pyb_tools.get_statcast_data')
+def get_statcast_data(start_date = '2023-03-30', end_date = (datetime.date.today() - datetime.timedelta(days = 2)).__str__(),
+                      store = None, columns = None) -> pd.DataFrame:
+    """Pulls statcast data for the specified timeframe and returns it as a pd.DataFrame. Dates default to the beginning of the 2023 season to yesterday.
+    If a statcast_store.StatcastStore is given, only days missing from it are downloaded and only the given columns are read.
+    A timeframe without games gives an empty frame with the given columns, as pybaseball returns one without any."""
+    if store is not None:
+        return store.read(start_date, end_date, columns = columns)
+    import pybaseball
     data = pybaseball.statcast(start_dt = start_date, end_dt = end_date).reset_index(drop = True)
+    if len(data) == 0:
+        return pd.DataFrame(columns = columns)
+    if columns is not None:
+        data = data[columns]
     return data
 
+def enable_cache():
+    """Turns on pybaseball's on-disk cache of statcast pulls."""
+    import pybaseball
+    pybaseball.cache.enable()
+
+def date_chunks(start_date, end_date, chunk_days) -> list:
+    """Splits start_date..end_date into (first, last) ranges of at most chunk_days days, newest range first."""
+    chunks = []
+    end = pd.Timestamp(end_date)
+    start = pd.Timestamp(start_date)
+    while end >= start:
+        first = max(start, end - pd.Timedelta(days = chunk_days - 1))
+        chunks.append((first.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
+        end = first - pd.Timedelta(days = 1)
+    return chunks
+
+def date_runs(dates) -> list:
+    """Groups sorted 'YYYY-MM-DD' dates into (first, last) runs of consecutive days."""
+    runs = []
+    for date in dates:
+        day = datetime.date.fromisoformat(date)
+        if len(runs) > 0 and datetime.date.fromisoformat(runs[-1][1]) + datetime.timedelta(days = 1) == day:
+            runs[-1][1] = date
+        else:
+            runs.append([date, date])
+    return [tuple(run) for run in runs]
+
+# Columns every leaderboard needs to build search urls and team columns. Presets list their extra columns in presets.preset_dict.
+# Tell apart pitches that share a search url, matched against the search results by get_vid.pick_play
+pitch_columns = ['at_bat_number', 'pitch_number']
+search_columns = ['game_date', 'batter', 'pitcher', 'inning', 'balls', 'strikes', 'description',
+                  'home_team', 'away_team', 'inning_topbot'] + pitch_columns
+zone_columns = ['sz_top', 'sz_bot', 'plate_x', 'plate_z']
+categorical_columns = ['home_team', 'away_team', 'description', 'events', 'inning_topbot']
+
+def compact_statcast(df) -> pd.DataFrame:
+    """Shrinks a statcast dataframe in place: team, description, event and topbot columns become categoricals,
+    integer columns are downcast to the smallest integer type, and float columns become float32 only where that is lossless."""
+    for col in df.columns:
+        s = df[col]
+        if col in categorical_columns:
+            df[col] = s.astype('category')
+        elif pd.api.types.is_integer_dtype(s.dtype):
+            df[col] = pd.to_numeric(s, downcast = 'integer')
+        elif pd.api.types.is_float_dtype(s.dtype) and s.dtype.itemsize > 4:
+            small = s.astype('float32')
+            if ((small.astype('float64') == s) | s.isna()).all():
+                df[col] = small
+    return df
+
 def get_search_args(s: pd.Series) -> dict:
     """Takes an entry in a pybaseball-generated DataFrame and extracts the data for search."""
     output = {}
@@ -19,63 +85,196 @@ def get_search_args(s: pd.Series) -> dict:
     output['strikes'] = s['strikes']
     output['result'] = s['description']
     output['home_team'] = s['home_team']
-    output['batter'] = s['batter']
-    output['pitcher'] = s['pitcher']
     output['topbot'] = s['inning_topbot']
 
     return output
 
+@instrument.traced('pyb_tools.get_search_args_list')
 def get_search_args_list(df) -> list:
-    """Takes a statcast dataframe and returns the list of args needed to get the URL."""
-    output = []
-    for i in range(len(df)):
-        output.append(get_search_args(df.iloc[i]))
-    return output
-
-
-def generate_caption(n, pitcherid, batterid, date, flavor = ''):
-    """Generates a caption for a compilation."""
-    df = pybaseball.playerid_reverse_lookup([pitcherid])
-    pitcher = df.loc[0, 'name_first'].title() + ' ' + df.loc[0, 'name_last'].title()
-    df = pybaseball.playerid_reverse_lookup([batterid])
-    batter = df.loc[0, 'name_first'].title() + ' ' + df.loc[0, 'name_last'].title()
+    """Takes a statcast dataframe and returns the list of args needed to get the URL, built column by column.
+    The pitch_columns are carried along when df has them, so get_vid can pick each pitch out of its search results."""
+    args = pd.DataFrame({'batter': df['batter'],
+                         'pitcher': df['pitcher'],
+                         'date': df['game_date'].astype(str).str[:10],
+                         'inning': df['inning'],
+                         'balls': df['balls'],
+                         'strikes': df['strikes'],
+                         'result': df['description'].astype(object),
+                         'home_team': df['home_team'].astype(object),
+                         'topbot': df['inning_topbot'].astype(object)})
+    for col in pitch_columns:
+        if col in df.columns:
+            args[col] = df[col]
+    return args.to_dict('records')
+
+
+class PlayerNameCache:
+    """Maps MLBAM ids to 'First Last' names, kept in memory and in a JSON file at path.
+    Only the max_size most recently used names are kept. Set path to None for a memory-only cache."""
+
+    def __init__(self, path = 'player_names.json', max_size = 10000):
+        self.path = path
+        self.max_size = max_size
+        self.names = OrderedDict()
+        if (path is not None) and os.path.exists(path):
+            with open(path) as f:
+                self.names.update(json.load(f))
+
+    @instrument.traced('pyb_tools.player_names')
+    def resolve(self, player_ids) -> dict:
+        """Returns {id: name} for every id, looking up all uncached ids in a single pybaseball.playerid_reverse_lookup call."""
+        player_ids = [int(i) for i in player_ids]
+        missing = [i for i in dict.fromkeys(player_ids) if str(i) not in self.names]
+        if len(missing) > 0:
+            import pybaseball
+            df = pybaseball.playerid_reverse_lookup(missing, key_type = 'mlbam')
+            # Like the old per-id lookup, the first register row wins when an id appears twice
+            df = df.drop_duplicates(subset = 'key_mlbam', keep = 'first')
+            for key, first, last in zip(df['key_mlbam'], df['name_first'], df['name_last']):
+                self.names[str(int(key))] = first.title() + ' ' + last.title()
+        output = {}
+        for i in player_ids:
+            if str(i) not in self.names:
+                raise KeyError(f'No player found for MLBAM id {i}')
+            self.names.move_to_end(str(i))
+            output[i] = self.names[str(i)]
+        while len(self.names) > self.max_size:
+            self.names.popitem(last = False)
+        if len(missing) > 0:
+            self.save()
+        return output
+
+    def save(self):
+        """Writes the cache to disk atomically."""
+        if self.path is None:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.names, f)
+        os.replace(tmp, self.path)
+
+player_names = None
+
+def get_player_names() -> PlayerNameCache:
+    """Returns the shared on-disk player name cache, creating it on first use."""
+    global player_names
+    if player_names is None:
+        player_names = PlayerNameCache()
+    return player_names
+
+def generate_caption(n, pitcherid, batterid, date, flavor = '', names = None):
+    """Generates a caption for a compilation. names is an optional {id: name} dict from PlayerNameCache.resolve."""
+    if names is None:
+        names = get_player_names().resolve([pitcherid, batterid])
+    pitcher = names[int(pitcherid)]
+    batter = names[int(batterid)]
     if len(flavor) > 0:
         flavor = ', ' + flavor
     output = f'{n}) {date} {pitcher} to {batter}{flavor}'
     return output
 
-def generate_captions(argslist, flavorlist = None):
-    """Generates mutliple captions for a compilation."""
+@instrument.traced('pyb_tools.generate_captions')
+def generate_captions(argslist, flavorlist = None, name_cache = None, first = 1):
+    """Generates mutliple captions for a compilation, resolving every player name in one batched lookup. Numbering starts at first."""
     if flavorlist == None:
         flavorlist = [''] * len(argslist)
+    if name_cache is None:
+        name_cache = get_player_names()
+    ids = [args['pitcher'] for args in argslist] + [args['batter'] for args in argslist]
+    names = name_cache.resolve(ids)
     output = []
     for i, args in enumerate(argslist):
-        output.append(generate_caption(i + 1, args['pitcher'], args['batter'], args['date'], flavorlist[i]))
+        output.append(generate_caption(i + first, args['pitcher'], args['batter'], args['date'], flavorlist[i], names))
     return output
 
 def determine_pitching_batting_team(df):
     """Creates columns pitching_team and batting_team."""
-    def create_pitching_team(x):
-        if x[2] == 'Top':
-            return x[0]
-        else:
-            return x[1]
-        
-    def create_batting_team(x):
-        if x[2] == 'Top':
-            return x[1]
-        else:
-            return x[0]
-
-    df['pitching_team'] = df[['home_team', 'away_team', 'inning_topbot']].apply(create_pitching_team, axis = 1)
-    df['batting_team'] = df[['home_team', 'away_team', 'inning_topbot']].apply(create_batting_team, axis = 1)
+    top = (df['inning_topbot'] == 'Top').to_numpy()
+    home = df['home_team'].to_numpy()
+    away = df['away_team'].to_numpy()
+    df['pitching_team'] = np.where(top, home, away)
+    df['batting_team'] = np.where(top, away, home)
 
     return df
 
-def cols_in_group(x, group):
-    a = x[0]
-    b = x[1]
-    return (a in group) or (b in group)
+class GroupIndex:
+    """Row positions of every value of the team and player columns of one statcast frame.
+    Each column is grouped once, on first use, so filtering the same frame for many teams or players is a dict lookup per group member."""
+
+    def __init__(self, df):
+        self.df = df
+        self.positions = {}
+
+    def lookup(self, column) -> dict:
+        """Returns {value: sorted row positions} for column."""
+        if column not in self.positions:
+            self.positions[column] = self.df.groupby(column, observed = True, sort = False).indices
+        return self.positions[column]
+
+    def rows(self, columns, group) -> np.ndarray:
+        """Sorted positions of the rows where any of columns holds a value in group."""
+        parts = [np.empty(0, dtype = np.intp)]
+        for column in columns:
+            positions = self.lookup(column)
+            parts.extend(positions[value] for value in group if value in positions)
+        return np.unique(np.concatenate(parts))
+
+def group_rows(df, columns, group, index = None) -> np.ndarray:
+    """Sorted positions of the rows of df where any of columns is in group, from a GroupIndex of df when one is given."""
+    if index is not None:
+        return index.rows(columns, group)
+    mask = np.zeros(len(df), dtype = bool)
+    for column in columns:
+        mask |= df[column].isin(group).to_numpy()
+    return np.flatnonzero(mask)
+
+def top_n(df, columns, n, ascending = False):
+    """Returns df.sort_values(columns, ascending, kind = 'stable').head(n) without sorting the whole frame.
+    Ties keep their original row order and NaNs go last. Only rows that can reach the top n are sorted."""
+    key = df[columns[0]].to_numpy(dtype = 'float64', na_value = np.nan)
+    if not ascending:
+        key = -key
+    valid = ~np.isnan(key)
+    if (n <= 0) or (n > valid.sum()):
+        # Rows with a missing key are ranked by the later sort columns, so fall back to a full sort
+        return df.sort_values(by = columns, ascending = ascending, kind = 'stable').head(n)
+    # Every row tied with the n-th key is kept so later sort columns and row order can break the tie
+    kth = np.partition(key[valid], n - 1)[n - 1]
+    df = df.iloc[np.flatnonzero(valid & (key <= kth))]
+    return df.sort_values(by = columns, ascending = ascending, kind = 'stable').head(n)
+
+def daily_top_n(df, columns, n, ascending = False):
+    """Returns the top n rows of each game_date, ranked like top_n, in one grouped pass ordered by game_date."""
+    df = df.sort_values(by = columns, ascending = ascending, kind = 'stable')
+    df = df.groupby('game_date', sort = False).head(n)
+    return df.sort_values(by = 'game_date', ascending = True, kind = 'stable')
+
+def high_low(sz_top, sz_bot, plate_z, correction = 0):
+    """Vectorized vertical miss distance (ft) of each pitch from the strike zone."""
+    sz_top = np.asarray(sz_top, dtype = 'float64')
+    sz_bot = np.asarray(sz_bot, dtype = 'float64')
+    plate_z = np.asarray(plate_z, dtype = 'float64')
+    inside = (plate_z > sz_bot - correction) & (plate_z < sz_top + correction)
+    miss = np.minimum(np.abs(sz_bot - plate_z + correction), np.abs(plate_z - sz_top - correction))
+    return np.where(inside, 0.0, miss)
+
+def off_edge(plate_x):
+    """Vectorized horizontal miss distance (ft) of each pitch from the edge of the plate."""
+    plate_x = np.asarray(plate_x, dtype = 'float64')
+    inside = (plate_x > -0.75) & (plate_x < 0.75)
+    return np.where(inside, 0.0, np.abs(plate_x) - 0.75)
+
+def miss_by(high_low, off_edge):
+    """Vectorized total miss distance (ft), rounded to the hundredth like the original row-wise version."""
+    high_low = np.asarray(high_low, dtype = 'float64')
+    off_edge = np.asarray(off_edge, dtype = 'float64')
+    return np.round(np.sqrt((high_low * high_low) + (off_edge * off_edge)), 2)
+
+def center_distance(plate_x, plate_z, sz_top, sz_bot):
+    """Vectorized distance (ft) of each pitch from the center of the strike zone."""
+    plate_x = np.asarray(plate_x, dtype = 'float64')
+    b = np.asarray(plate_z, dtype = 'float64') - ((np.asarray(sz_top, dtype = 'float64') + np.asarray(sz_bot, dtype = 'float64')) / 2)
+    return np.sqrt((plate_x * plate_x) + (b * b))
 
 def kzone_miss(df):
     """Takes in a statcast dataframe and calculates the distance the pitch misses the strike zone."""
@@ -83,73 +282,72 @@ def kzone_miss(df):
     correction = 0
     # This was 0.3, but lots of balls that appeared low were being picked up as strikes
 
-    def ft_high_or_low(x):
-        sz_top, sz_bot, plate_z = x
-        if (plate_z > sz_bot - correction) and (plate_z < sz_top + correction):
-            return 0
-        return min(abs(sz_bot - plate_z + correction), abs(plate_z - sz_top - correction))
-
-    def off_edge(x):
-        if (x > -0.75) and (x < 0.75):
-            return 0
-        else:
-            return abs(x) - 0.75
-
-    def miss_by(x):
-        a, b = x
-        return round(((a * a) + (b * b)) ** 0.5, ndigits = 2)
-
     df = df.dropna(subset = ['sz_top', 'sz_bot', 'plate_z', 'plate_x'])
 
-    df['high_low'] = df[['sz_top', 'sz_bot', 'plate_z']].apply(ft_high_or_low, axis = 1)
-    df['off_edge'] = df['plate_x'].apply(off_edge)
-    df['miss_by'] = df[['high_low', 'off_edge']].apply(miss_by, axis = 1)
+    # Frames that went through derive_features already carry these columns
+    if 'miss_by' not in df.columns:
+        df['high_low'] = high_low(df['sz_top'], df['sz_bot'], df['plate_z'], correction)
+        df['off_edge'] = off_edge(df['plate_x'])
+        df['miss_by'] = miss_by(df['high_low'], df['off_edge'])
 
     return df
 
+@instrument.traced('pyb_tools.derive_features')
+def derive_features(df):
+    """Computes the columns shared by the presets (miss_by, off_center, pitching/batting team, in_play mask) once per DataFrame.
+    Pitches without tracking data get NaN geometry, and geometry is skipped if the zone columns were not loaded. Columns already present are not recomputed."""
+    if 'batting_team' not in df.columns:
+        df = determine_pitching_batting_team(df)
+    if 'in_play' not in df.columns:
+        df['in_play'] = (df['description'] == 'hit_into_play').to_numpy()
+    if ('miss_by' not in df.columns) and all(col in df.columns for col in zone_columns):
+        df['high_low'] = high_low(df['sz_top'], df['sz_bot'], df['plate_z'])
+        df['off_edge'] = off_edge(df['plate_x'])
+        df['miss_by'] = miss_by(df['high_low'], df['off_edge'])
+        df['off_center'] = center_distance(df['plate_x'], df['plate_z'], df['sz_top'], df['sz_bot'])
+    return df
+
+def in_play(df):
+    """Boolean mask of balls hit into play, read from the derived in_play column when available."""
+    if 'in_play' in df.columns:
+        return df['in_play']
+    return df['description'] == 'hit_into_play'
+
 def batted_balls(df, teams):
     """Filters a dataframe to only include balls hit in play."""
-    df = df.loc[df['description'] == 'hit_into_play']
+    df = df.loc[in_play(df)]
     if len(teams) > 0:
-        df = df.loc[df['home_team'].apply(lambda x: x in teams) == df['inning_topbot'].apply(lambda x: x == 'Bot')]
+        df = df.loc[df['home_team'].isin(teams) == (df['inning_topbot'] == 'Bot')]
     return df
 
 
 def off_center(df):
     """Calculates the distance from the pitch's arrival point from the center of the strike zone"""
-
-    def calc_off_center(x):
-        plate_x, plate_z, sz_top, sz_bot = x
-        a = plate_x
-        b = plate_z - ((sz_top + sz_bot)/2)
-        c = (a * a) + (b * b)
-        return c ** 0.5
-    
-    df['off_center'] = df[['plate_x', 'plate_z', 'sz_top', 'sz_bot']].apply(calc_off_center, axis = 1)
+    if 'off_center' in df.columns:
+        return df
+    df['off_center'] = center_distance(df['plate_x'], df['plate_z'], df['sz_top'], df['sz_bot'])
     return df
 
 
 def worst_called_strikes(df, teams, players):
-    """Takes in a statcast dataframe, filters for called strikes, and sorts by the most egregious called strikes."""
+    """Takes in a statcast dataframe, filters for called strikes, and scores the most egregious called strikes by miss_by."""
     df = df.dropna(subset = ['sz_top', 'sz_bot', 'plate_x' , 'plate_z'])
     df = df.loc[df['description'] == 'called_strike']
     df = kzone_miss(df)
     if len(teams) > 0:
-        df = df.loc[df['home_team'].apply(lambda x: x in teams) == df['inning_topbot'].apply(lambda x: x == 'Bot')]
-    df = df.sort_values(by = 'miss_by', ascending = False)
+        df = df.loc[df['home_team'].isin(teams) == (df['inning_topbot'] == 'Bot')]
     return df
 
 def worst_called_balls(df, teams, players):
-    """Takes in a statcast dataframe, filters for called balls, and sorts by the most egregious called balls."""
+    """Takes in a statcast dataframe, filters for called balls, and scores the most egregious called balls by off_center."""
     df = df.dropna(subset = ['sz_top', 'sz_bot', 'plate_x' , 'plate_z'])
     df = df.loc[df['description'] == 'ball']
     df = off_center(df)
     df = kzone_miss(df)
     df = df.loc[df['miss_by'] == 0]
     if len(teams) > 0:
-        df = df.loc[df['home_team'].apply(lambda x: x in teams) == df['inning_topbot'].apply(lambda x: x == 'Top')]
-    df['off_center'] = df['off_center'].apply(lambda x: -x)
-    df = df.sort_values(by = 'off_center', ascending = False)
+        df = df.loc[df['home_team'].isin(teams) == (df['inning_topbot'] == 'Top')]
+    df['off_center'] = -df['off_center']
     return df
 
 def scorchers(df, teams, players):
@@ -178,8 +376,7 @@ def called_corners(df, teams, players):
     df = df.loc[df['miss_by'] == 0]
     df = off_center(df)
     if len(teams) > 0:
-        df = df.loc[df['home_team'].apply(lambda x: x in teams) == df['inning_topbot'].apply(lambda x: x == 'Top')]
-    df = df.sort_values(by = 'off_center', ascending = False)
+        df = df.loc[df['home_team'].isin(teams) == (df['inning_topbot'] == 'Top')]
     return df
 
 def ump_show(df, teams, players):
@@ -193,33 +390,20 @@ def ump_show_flavor(x):
     return f'{x[0] * 12:.1f} inches outside zone'
 
 def clutch(df, teams, players):
-    """Takes in a statcast dataframe, then finds the most impactful moments by WPA."""
+    """Takes in a statcast dataframe, then scores the most impactful moments by WPA in delta_win_exp."""
     
-    def topbot(x):
-        if x == 'Top':
-            return 1
-        else:
-            return -1
-
-    def in_group(x):
-        if x in group:
-            return 1
-        else:
-            return -1
-
+    # assign rather than set columns so a frame shared between presets is left untouched
     if len(teams) + len(players) == 0:
-        df['delta_win_exp'] = df['delta_home_win_exp'].apply(abs)
+        df = df.assign(delta_win_exp = df['delta_home_win_exp'].abs())
     else:
         if len(teams) > 0:
-            group = teams
-            df['in_group'] = df['home_team'].apply(in_group)
-            df['delta_win_exp'] = df['delta_home_win_exp'] * df['in_group']
+            df = df.assign(in_group = np.where(df['home_team'].isin(teams), 1, -1))
+            df = df.assign(delta_win_exp = df['delta_home_win_exp'] * df['in_group'])
         else:
-            group = players
-            df['topbot'] = df['inning_topbot'].apply(topbot)
-            df['in_group'] = df['pitcher'].apply(in_group)
-            df['delta_win_exp'] = df['delta_home_win_exp'] * df['topbot'] * df['in_group']
-    return df.sort_values(by = 'delta_win_exp', ascending = False)
+            df = df.assign(topbot = np.where(df['inning_topbot'] == 'Top', 1, -1))
+            df = df.assign(in_group = np.where(df['pitcher'].isin(players), 1, -1))
+            df = df.assign(delta_win_exp = df['delta_home_win_exp'] * df['topbot'] * df['in_group'])
+    return df
 
 
 def clutch_flavor(x):
@@ -245,12 +429,12 @@ def full_count_walks(df, teams, players):
 
 def hit_distance(df, teams, players):
     """Takes in a Statcast dataframe, and sorts it by the distance the ball traveled."""
-    df = df.loc[df['description'] == 'hit_into_play']
+    df = df.loc[in_play(df)]
     if len(teams) + len(players) > 0:
         if len(teams) > 0:
-            df = df.loc[df['batting_team'].apply(lambda x: x in teams)]
+            df = df.loc[df['batting_team'].isin(teams)]
         else:
-            df = df.loc[df['batter'].apply(lambda x: x in players)]
+            df = df.loc[df['batter'].isin(players)]
     return df
 
 def home_run_flavor(x):
@@ -260,16 +444,16 @@ def home_run_flavor(x):
 def bad_swings(df, teams, players):
     df = kzone_miss(df)
     if len(teams) > 0:
-        df = df.loc[df['batting_team'].apply(lambda x: x in teams)]
-    df = df.loc[df['description'].apply(lambda x: x in ('swinging_strike', 'swinging_strike_blocked'))]
-    df = df.loc[df['events'].apply(lambda x: x in ('strikeout', 'strikeout_double_play'))]
+        df = df.loc[df['batting_team'].isin(teams)]
+    df = df.loc[df['description'].isin(['swinging_strike', 'swinging_strike_blocked'])]
+    df = df.loc[df['events'].isin(['strikeout', 'strikeout_double_play'])]
     return df
 
 def chasing_hits(df, teams, players):
     df = kzone_miss(df)
     if len(teams) > 0:
-        df = df.loc[df['batting_team'].apply(lambda x: x in teams)]
-    df = df.loc[df['description'].apply(lambda x: x == 'hit_into_play')]
-    df = df.loc[df['events'].apply(lambda x: x in ['single', 'double', 'triple', 'home_run'])]
+        df = df.loc[df['batting_team'].isin(teams)]
+    df = df.loc[in_play(df)]
+    df = df.loc[df['events'].isin(['single', 'double', 'triple', 'home_run'])]
     return df
 
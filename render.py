@@ -0,0 +1,159 @@
+# Tools to trim, caption and encode highlight clips into compilation segments
+import multiprocessing
+import os
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from moviepy.config import get_setting
+from moviepy.editor import concatenate_videoclips, VideoFileClip, TextClip, AudioClip
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+# Every segment is encoded with the same settings, so the concat demuxer can join them without re-encoding
+segment_size = (1280, 720)
+segment_fps = 60
+audio_fps = 44100
+
+# Rendered captions by (text, font, fontsize, color), least recently used first
+caption_bitmaps = OrderedDict()
+max_caption_bitmaps = 256
+
+def prepare_clip(filename, caption = None, max_duration = 20, truncate_beginning = True, trimmed = None):
+    """Opens a downloaded clip and applies the compilation edits: trims the first 2 seconds, caps the duration and overlays the caption.
+    With trimmed, a filename, the kept window is first cut from the source into trimmed by stream copy (see trim_clip),
+    so only the frames from the keyframe before the cut onwards are ever decoded."""
+    if trimmed is not None:
+        info = probe_clip(filename)
+        start, end = clip_window(info['duration'], max_duration, truncate_beginning)
+        clip = VideoFileClip(trim_clip(filename, trimmed, start, end), fps_source="fps")
+        clip = clip.subclip(0, min(end - start, clip.duration))
+    else:
+        clip = VideoFileClip(filename, fps_source="fps")
+        if truncate_beginning:
+            clip = clip.subclip(2, clip.duration)
+        if clip.duration > max_duration:
+            clip = clip.subclip(0, max_duration)
+    print(f'{filename} framerate: {clip.fps}')
+    if caption != None:
+        print(caption)
+        clip = add_caption(clip, caption)
+    return clip
+
+def probe_clip(filename) -> dict:
+    """Reads duration, fps and size from the container metadata with a single ffmpeg call, without starting a frame reader."""
+    infos = ffmpeg_parse_infos(filename, fps_source = 'fps')
+    return {'duration': infos['duration'], 'fps': infos['video_fps'], 'size': infos['video_size']}
+
+def clip_window(duration, max_duration = 20, truncate_beginning = True):
+    """Start and end, in seconds, of the part of a clip that goes in the compilation."""
+    start = 2 if truncate_beginning else 0
+    return start, min(duration, start + max_duration)
+
+def trim_clip(filename, output, start, end) -> str:
+    """Copies start..end of a clip into output without re-encoding. ffmpeg seeks to the keyframe before start
+    and writes an edit list, so readers still begin exactly at start. Returns output."""
+    subprocess.run([get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error', '-ss', f'{start:.3f}', '-i', filename,
+                    '-t', f'{end - start:.3f}', '-map', '0', '-c', 'copy', output], check = True)
+    return output
+
+def caption_bitmap(caption, font = 'Arial', fontsize = 36, color = 'white'):
+    """Renders a caption once with TextClip and returns (premultiplied color, 1 - alpha) as float arrays ready for blending.
+    Results are cached by text, font, size and color."""
+    key = (caption, font, fontsize, color)
+    if key in caption_bitmaps:
+        caption_bitmaps.move_to_end(key)
+        return caption_bitmaps[key]
+    text = TextClip(caption, font = font, fontsize = fontsize, color = color)
+    bitmap = premultiply(text.get_frame(0), text.mask.get_frame(0))
+    text.close()
+    caption_bitmaps[key] = bitmap
+    if len(caption_bitmaps) > max_caption_bitmaps:
+        caption_bitmaps.popitem(last = False)
+    return bitmap
+
+def premultiply(rgb, alpha):
+    """Turns an RGB image and its 0-1 mask into (alpha * rgb, 1 - alpha) with the same arithmetic as moviepy's blit."""
+    alpha = np.dstack(3 * [alpha])
+    return 1.0 * alpha * rgb, 1.0 - alpha
+
+def overlay(frame, bitmap, pos):
+    """Alpha blends a caption bitmap onto a frame at pos = (x, y), touching only the pixels under the caption.
+    Gives the same pixels as compositing the caption with CompositeVideoClip."""
+    color, inverse_alpha = bitmap
+    x, y = pos
+    h, w = color.shape[:2]
+    frame_h, frame_w = frame.shape[:2]
+    x1, y1 = max(0, -x), max(0, -y)
+    x2, y2 = min(w, frame_w - x), min(h, frame_h - y)
+    if (x1 >= x2) or (y1 >= y2):
+        return frame
+    frame = np.array(frame)
+    region = frame[y + y1:y + y2, x + x1:x + x2]
+    region[:] = color[y1:y2, x1:x2] + inverse_alpha[y1:y2, x1:x2] * region
+    return frame
+
+def add_caption(clip, caption, font = 'Arial', fontsize = 36, color = 'white'):
+    """Burns a caption into the bottom left of every frame of clip, where the compilation has always placed it."""
+    bitmap = caption_bitmap(caption, font, fontsize, color)
+    pos = (60, clip.h - 140)
+    return clip.fl_image(lambda frame: overlay(frame, bitmap, pos))
+
+def normalize_clip(clip, size = segment_size):
+    """Fits a clip into size the way concatenate_videoclips(method = 'compose') does: centered on black, scaled down only if it is larger.
+    Clips without sound get a silent track so every segment has the same streams."""
+    w, h = size
+    if (clip.w > w) or (clip.h > h):
+        clip = clip.resize(min(w / clip.w, h / clip.h))
+    if tuple(clip.size) != (w, h):
+        clip = clip.on_color(size = (w, h), color = (0, 0, 0), pos = 'center')
+    if clip.audio is None:
+        clip = clip.set_audio(AudioClip(lambda t: [0, 0], duration = clip.duration, fps = audio_fps))
+    return clip
+
+def render_segment(filename, output, caption = None, max_duration = 20, truncate_beginning = True, size = segment_size, fps = segment_fps,
+                   trim = True):
+    """Applies the compilation edits to one clip and encodes it to its own segment file with the shared segment settings. Returns output.
+    With trim, the kept window is cut out by stream copy first, so the rest of the source is never decoded."""
+    trimmed = output + '.trim.mp4' if trim else None
+    clip = normalize_clip(prepare_clip(filename, caption, max_duration, truncate_beginning, trimmed), size)
+    try:
+        clip.write_videofile(output, fps = fps, codec = 'libx264', audio_codec = 'aac', audio_fps = audio_fps, preset = 'medium',
+                             ffmpeg_params = ['-pix_fmt', 'yuv420p', '-ac', '2'], threads = 1, logger = None)
+    finally:
+        clip.close()
+        if (trimmed is not None) and os.path.exists(trimmed):
+            os.remove(trimmed)
+    return output
+
+def encoder_pool(n_workers = None) -> ProcessPoolExecutor:
+    """Process pool for render_segment, one worker per core by default.
+    Workers are spawned rather than forked because the pool is started while download threads are running."""
+    return ProcessPoolExecutor(max_workers = n_workers or os.cpu_count(), mp_context = multiprocessing.get_context('spawn'))
+
+def render_segments(jobs, n_workers = None) -> list:
+    """Runs render_segment for each tuple of arguments in jobs in a process pool. Returns the outputs in order."""
+    with encoder_pool(n_workers) as pool:
+        futures = [pool.submit(render_segment, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+def join_segments(segments, output = 'compilation.mp4'):
+    """Concatenates encoded segments, in order, into the final compilation with the ffmpeg concat demuxer, copying the streams. Returns output."""
+    if len(segments) == 0:
+        raise ValueError(f'No segments to join into {output}')
+    listing = output + '.segments.txt'
+    with open(listing, 'w') as f:
+        for segment in segments:
+            path = os.path.abspath(segment).replace("'", "'\\''")
+            f.write(f"file '{path}'\n")
+    try:
+        subprocess.run([get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', listing,
+                        '-c', 'copy', '-movflags', '+faststart', output], check = True)
+    finally:
+        os.remove(listing)
+    return output
+
+def join_clips(clips, output = 'compilation.mp4'):
+    """Concatenates clips that have not been encoded yet and encodes the whole compilation in one pass. Returns output."""
+    compilation = concatenate_videoclips(clips, method = 'compose')
+    compilation.write_videofile(output)
+    return output
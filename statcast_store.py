@@ -0,0 +1,79 @@
+# Local Parquet store of statcast data, partitioned by game_date
+import datetime
+import hashlib
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from manifest import Manifest
+from pyb_tools import date_runs
+
+class StatcastStore(Manifest):
+    """Keeps one Parquet file per game_date under path and only asks pybaseball for days it does not have yet.
+    Days fetched less than settle_days after they were played may still change, so they are refetched on the next read.
+    The manifest maps each stored day to {'rows': int, 'fetched': date, 'final': bool, 'hash': str}."""
+
+    def __init__(self, path = 'statcast_store', settle_days = 2, row_group_size = 5000):
+        self.path = path
+        self.settle_days = settle_days
+        self.row_group_size = row_group_size
+        self.manifest_path = os.path.join(path, 'manifest.json')
+        os.makedirs(path, exist_ok = True)
+        self.manifest = self.load_manifest()
+
+    def day_path(self, date):
+        """Path of the Parquet file holding a single game_date."""
+        return os.path.join(self.path, f'game_date={date}', 'part.parquet')
+
+    def missing_dates(self, start_date, end_date) -> list:
+        """Lists the dates in start_date..end_date that are absent or were stored before they were final."""
+        dates = [d.strftime('%Y-%m-%d') for d in pd.date_range(start_date, end_date)]
+        return [d for d in dates if not self.manifest.get(d, {}).get('final', False)]
+
+    def fetch(self, start_date, end_date):
+        """Downloads every missing day in start_date..end_date, one pybaseball.statcast call per run of consecutive days."""
+        import pybaseball
+        for run_start, run_end in date_runs(self.missing_dates(start_date, end_date)):
+            data = pybaseball.statcast(start_dt = run_start, end_dt = run_end)
+            days = {}
+            if (data is not None) and (len(data) > 0):
+                for date, day in data.groupby(pd.to_datetime(data['game_date']).dt.strftime('%Y-%m-%d'), sort = False):
+                    days[date] = day
+            for date in pd.date_range(run_start, run_end):
+                date = date.strftime('%Y-%m-%d')
+                self.write_day(date, days.get(date))
+            self.save_manifest()
+
+    def write_day(self, date, df):
+        """Stores one day of data and records it in the manifest with a hash of its contents. Days without games are recorded with no file."""
+        path = self.day_path(date)
+        if (df is None) or (len(df) == 0):
+            if os.path.exists(path):
+                os.remove(path)
+            rows = 0
+            digest = None
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            tmp = path + '.tmp'
+            pq.write_table(pa.Table.from_pandas(df.reset_index(drop = True), preserve_index = False), tmp,
+                           row_group_size = self.row_group_size)
+            os.replace(tmp, path)
+            rows = len(df)
+            digest = hashlib.sha256(pd.util.hash_pandas_object(df, index = False).to_numpy().tobytes()).hexdigest()
+        self.manifest[date] = {'rows': rows, 'fetched': datetime.date.today().isoformat(), 'final': self.is_final(date), 'hash': digest}
+
+    def read(self, start_date, end_date, columns = None, filters = None, fetch = True) -> pd.DataFrame:
+        """Returns statcast data for start_date..end_date, fetching missing days first.
+        Only the given columns are read, and filters (pyarrow DNF filters) skip row groups using their statistics.
+        Rows come newest day first, matching pybaseball.statcast. pybaseball picks integer widths per pull, so a column stored as
+        int8 on one day and int16 or float on another is widened to the type that holds both.
+        Set fetch to False to only read days already stored, e.g. from worker processes after the parent has fetched."""
+        if fetch:
+            self.fetch(start_date, end_date)
+        dates = [d.strftime('%Y-%m-%d') for d in pd.date_range(start_date, end_date)][::-1]
+        tables = [pq.read_table(self.day_path(d), columns = columns, filters = filters)
+                  for d in dates if self.manifest.get(d, {}).get('rows', 0) > 0]
+        if len(tables) == 0:
+            return pd.DataFrame(columns = columns)
+        df = pa.concat_tables(tables, promote_options = 'permissive').to_pandas()
+        return df.reset_index(drop = True)
@@ -0,0 +1,94 @@
+# Shared fixtures for the offline tests. Run with: python -m pytest tests
+import os
+import sys
+import types
+import numpy as np
+import pandas as pd
+import pytest
+import savant as savant_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def statcast_day(date, n = 20, seed = 0):
+    """A small statcast-shaped frame of n pitches on date, with the columns every preset reads."""
+    rng = np.random.default_rng(seed)
+    teams = np.array(['BOS', 'NYY', 'SF', 'LAD'], dtype = object)
+    return pd.DataFrame({
+        'game_date': pd.Timestamp(date),
+        'batter': rng.integers(400000, 700000, n),
+        'pitcher': rng.integers(400000, 700000, n),
+        'home_team': teams[rng.integers(0, 2, n)],
+        'away_team': teams[rng.integers(2, 4, n)],
+        'inning_topbot': np.where(rng.random(n) < 0.5, 'Top', 'Bot').astype(object),
+        'inning': rng.integers(1, 10, n),
+        'balls': rng.integers(0, 4, n),
+        'strikes': rng.integers(0, 3, n),
+        'at_bat_number': rng.integers(1, 80, n),
+        'pitch_number': rng.integers(1, 7, n),
+        'description': np.array(['ball', 'called_strike', 'hit_into_play'], dtype = object)[rng.integers(0, 3, n)],
+        'events': np.array([None, 'walk', 'single'], dtype = object)[rng.integers(0, 3, n)],
+        'plate_x': np.round(rng.normal(0, 0.9, n), 2),
+        'plate_z': np.round(rng.normal(2.4, 0.9, n), 2),
+        'sz_top': np.round(rng.normal(3.4, 0.15, n), 2),
+        'sz_bot': np.round(rng.normal(1.6, 0.1, n), 2),
+        'launch_speed': np.round(rng.normal(88, 14, n), 1),
+        'launch_angle': np.round(rng.normal(12, 25, n)),
+        'hit_distance_sc': np.round(rng.normal(180, 110, n)),
+        'delta_home_win_exp': np.round(rng.normal(0, 0.03, n), 3),
+    })
+
+@pytest.fixture
+def pybaseball(monkeypatch):
+    """Replaces the pybaseball module with an offline stand-in. statcast serves statcast_day frames, newest day first like the
+    real pull, and returns an empty frame for days listed in no_games. Every call is recorded in calls."""
+    module = types.ModuleType('pybaseball')
+    module.calls = []
+    module.no_games = set()
+
+    def statcast(start_dt, end_dt, **kwargs):
+        module.calls.append((start_dt, end_dt))
+        days = [statcast_day(d, seed = int(d.strftime('%Y%m%d'))) for d in pd.date_range(start_dt, end_dt)[::-1]
+                if d.strftime('%Y-%m-%d') not in module.no_games]
+        if len(days) == 0:
+            return pd.DataFrame()
+        return pd.concat(days, ignore_index = True)
+
+    def playerid_reverse_lookup(player_ids, key_type = 'mlbam'):
+        return pd.DataFrame({'key_mlbam': list(player_ids), 'name_first': [f'first{i}' for i in player_ids],
+                             'name_last': [f'last{i}' for i in player_ids]})
+
+    module.statcast = statcast
+    module.playerid_reverse_lookup = playerid_reverse_lookup
+    module.cache = types.SimpleNamespace(enable = lambda: None)
+    monkeypatch.setitem(sys.modules, 'pybaseball', module)
+    return module
+
+@pytest.fixture
+def savant(monkeypatch, tmp_path):
+    """Points get_vid at a local SavantServer (see savant.py) with a fresh session, and runs the test in tmp_path."""
+    import get_vid
+    server = savant_server.start_server()
+    monkeypatch.setattr(get_vid, 'savant_url', server.base)
+    monkeypatch.setattr(get_vid, 'session', None)
+    monkeypatch.chdir(tmp_path)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def copy_encoder(monkeypatch):
+    """Swaps render_segment for a copy of the downloaded clip and the encoder processes for threads, so render_pipelined runs
+    without encoding. Returns the list of segment filenames rendered."""
+    import shutil
+    from concurrent.futures import ThreadPoolExecutor
+    import render
+    calls = []
+
+    def copy_segment(filename, output, *args):
+        calls.append(output)
+        shutil.copy(filename, output)
+        return output
+
+    monkeypatch.setattr(render, 'render_segment', copy_segment)
+    monkeypatch.setattr(render, 'encoder_pool', lambda n_workers = None: ThreadPoolExecutor(n_workers))
+    return calls
@@ -0,0 +1,180 @@
+# A local stand-in for BaseballSavant, serving the saved pages in tests/fixtures, and a fake Selenium driver that browses it
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from bs4 import BeautifulSoup
+
+fixtures = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def fixture(name):
+    with open(os.path.join(fixtures, name)) as f:
+        return f.read()
+
+def video_bytes(name, size = 50_000):
+    """Deterministic stand-in content for the video called name."""
+    data = f'{name} '.encode()
+    return (data * (size // len(data) + 1))[:size]
+
+class SavantServer(ThreadingHTTPServer):
+    """Serves search pages, detail rows, video pages and videos on a free local port. Every request path is kept in requests.
+    details picks how detail rows are served: 'json', 'html', or 'missing' for a 404 that sends clients to the Selenium fallback.
+    Videos are video_bytes(name) unless set in videos, and names in broken give a 404. They are served with an ETag and honour Range
+    and If-Range, and the (Range, If-Range) headers of every video request are kept in ranges.
+    The next drops video responses are cut off after cut bytes, and the next stalls pause for stall_seconds there, to throttle them."""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SavantHandler)
+        self.base = f'http://127.0.0.1:{self.server_address[1]}'
+        self.requests = []
+        self.details = 'json'
+        self.videos = {}
+        self.broken = set()
+        self.ranges = []
+        self.cut = 10_000
+        self.drops = 0
+        self.stalls = 0
+        self.stall_seconds = 1.0
+        self.lock = threading.Lock()
+
+    def video(self, name):
+        if name not in self.videos:
+            self.videos[name] = video_bytes(name)
+        return self.videos[name]
+
+class SavantHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, body = b'', content_type = 'text/html', headers = {}):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def page(self, name, **values):
+        self.send(200, fixture(name).replace('{base}', self.server.base).replace('{play_id}', values.get('play_id', '')).encode())
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/statcast_search':
+            if query.get('type') != ['details']:
+                return self.page('search.html')
+            if server.details == 'json':
+                return self.send(200, fixture('details.json').encode(), 'application/json')
+            if server.details == 'html':
+                return self.page('details.html')
+            return self.send(404)
+        if url.path == '/sporty-videos':
+            play_id = query['playId'][0]
+            return self.page('sporty_videos_away.html' if query.get('videoType') == ['AWAY'] else 'sporty_videos.html', play_id = play_id)
+        if url.path.startswith('/video/'):
+            name = url.path[len('/video/'):-len('.mp4')]
+            if name in server.broken:
+                return self.send(404)
+            return self.video(name)
+        self.send(404)
+
+    def video(self, name):
+        server = self.server
+        data = server.video(name)
+        etag = '"' + hashlib.sha256(data).hexdigest()[:16] + '"'
+        requested, validator = self.headers.get('Range'), self.headers.get('If-Range')
+        with server.lock:
+            server.ranges.append((requested, validator))
+            drop, stall = server.drops > 0, server.stalls > 0
+            server.drops -= drop
+            server.stalls -= stall
+        start = 0
+        if (requested is not None) and (validator in (None, etag)):
+            start = int(requested[len('bytes='):].split('-')[0])
+            if start >= len(data):
+                return self.send(416, headers = {'Content-Range': f'bytes */{len(data)}'})
+        body = data[start:]
+        self.send_response(206 if start > 0 else 200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        if start > 0:
+            self.send_header('Content-Range', f'bytes {start}-{len(data) - 1}/{len(data)}')
+        self.end_headers()
+        if drop or stall:
+            self.wfile.write(body[:server.cut])
+            self.wfile.flush()
+            if drop:
+                self.close_connection = True
+                return
+            time.sleep(server.stall_seconds)
+            body = body[server.cut:]
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+def start_server():
+    server = SavantServer()
+    threading.Thread(target = server.serve_forever, args = (0.05,), daemon = True).start()
+    return server
+
+selectors = {'class name': '.{}', 'id': '#{}', 'css selector': '{}'}
+
+class FakeElement:
+    def __init__(self, driver, tag):
+        self.driver = driver
+        self.tag = tag
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def get_attribute(self, name):
+        return self.tag.get(name)
+
+    def click(self):
+        if self.tag.get('href'):
+            self.driver.get(self.tag['href'])
+
+class FakeDriver:
+    """Just enough of a Selenium WebDriver for get_vid: pages are fetched from the SavantServer at base, whatever host a url names,
+    and elements are found with CSS selectors on the parsed page."""
+
+    def __init__(self, base, session):
+        self.base = base
+        self.session = session
+        self.soup = BeautifulSoup('', 'html.parser')
+        self.visited = []
+        self.quit_calls = 0
+
+    def get(self, url):
+        url = urlsplit(url)
+        self.visited.append(url.path)
+        r = self.session.get(f'{self.base}{url.path}?{url.query}', timeout = 5)
+        self.soup = BeautifulSoup(r.text, 'html.parser')
+
+    def find_elements(self, by, value):
+        return [FakeElement(self, tag) for tag in self.soup.select(selectors[by].format(value))]
+
+    def find_element(self, by, value):
+        from selenium.common.exceptions import NoSuchElementException
+        elements = self.find_elements(by, value)
+        if len(elements) == 0:
+            raise NoSuchElementException(value)
+        return elements[0]
+
+    def quit(self):
+        self.quit_calls += 1
@@ -0,0 +1,40 @@
+import os
+import pandas as pd
+import pytest
+import daily_reel
+import presets
+from savant import fixtures
+
+@pytest.fixture
+def render_calls(savant, copy_encoder):
+    """Serves the clip fixture for every play, with the encoder swapped for a copy so only the joins run ffmpeg. Lists each rendered segment."""
+    with open(os.path.join(fixtures, 'clip.mp4'), 'rb') as f:
+        savant.videos['fast-pitch'] = f.read()
+    savant.details = 'html'
+    return copy_encoder
+
+def make_reel(reel, end_date):
+    return presets.make_daily_reel(reel, '2023-04-01', end_date, 2, 'called_corners')
+
+def test_only_new_days_are_rendered(pybaseball, render_calls):
+    import render
+    reel = daily_reel.DailyReel('reel')
+    assert make_reel(reel, '2023-04-02') == 'compilation.mp4'
+    assert len(render_calls) == 4
+    assert pybaseball.calls == [('2023-04-01', '2023-04-02')]
+    render_calls.clear()
+    reel = daily_reel.DailyReel('reel')
+    make_reel(reel, '2023-04-03')
+    n_rows = {date: len(day['rows']) for date, day in reel.days.items()}
+    assert [os.path.basename(path) for path in render_calls] == [f'2023-04-03.{k}.mp4' for k in range(n_rows['2023-04-03'])]
+    assert pybaseball.calls[1:] == [('2023-04-03', '2023-04-03')]
+    clip = render.probe_clip(os.path.join(fixtures, 'clip.mp4'))['duration']
+    assert render.probe_clip('compilation.mp4')['duration'] == pytest.approx(sum(n_rows.values()) * clip, abs = 0.2)
+
+def test_runs_without_games_make_no_compilation(pybaseball, render_calls):
+    pybaseball.no_games.update(d.strftime('%Y-%m-%d') for d in pd.date_range('2023-04-01', '2023-04-02'))
+    reel = daily_reel.DailyReel('reel')
+    assert make_reel(reel, '2023-04-02') is None
+    assert render_calls == []
+    assert not os.path.exists('compilation.mp4')
+    assert {date: day['rows'] for date, day in reel.days.items()} == {'2023-04-01': [], '2023-04-02': []}
@@ -0,0 +1,190 @@
+import os
+import pytest
+import requests
+import get_vid
+from savant import FakeDriver, video_bytes
+
+rows = [{'play_id': 'fast', 'at_bat_number': 40, 'pitch_number': 2, 'release_speed': 98.1},
+        {'play_id': 'slow', 'at_bat_number': 12, 'pitch_number': 5, 'release_speed': 84.0}]
+
+def test_clips_sharing_a_search_get_the_matching_result():
+    # Savant lists results fastest first, so the first clip in leaderboard order is not the first result
+    args = [{'pitcher': 1, 'batter': 2, 'date': '2023-04-01', 'inning': 3, 'balls': 1, 'strikes': 2, 'result': 'ball',
+             'at_bat_number': n, 'pitch_number': k} for n, k in [(12, 5), (40, 2)]]
+    urls = get_vid.get_search_urls(args)
+    assert get_vid.coalesce_searches(urls) == [(urls[0], [0, 1])]
+    assert [get_vid.pick_play(rows, pitch) for pitch in get_vid.get_pitches(args)] == ['slow', 'fast']
+
+def test_pitch_attributes_are_compared_as_text():
+    assert get_vid.pick_play([{'play_id': 'a', 'pitch_number': '5'}], {'pitch_number': 5}) == 'a'
+
+def test_rows_without_pitch_attributes_give_the_first_result():
+    assert get_vid.pick_play([{'play_id': 'a'}, {'play_id': 'b'}], {'at_bat_number': 40, 'pitch_number': 2}) == 'a'
+
+def test_no_matching_result_is_a_lookup_error():
+    with pytest.raises(LookupError):
+        get_vid.pick_play(rows, {'at_bat_number': 7, 'pitch_number': 1})
+
+def search_url(pitcher):
+    return get_vid.get_search_url(pitcher = pitcher, batter = 2, date = '2023-04-01', inning = 3, balls = 1, strikes = 2, result = 'ball')
+
+def read(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+def test_parallel_downloads_keep_url_order_and_collect_failures(savant):
+    savant.broken.add('slow-pitch')
+    urls = [search_url(p) for p in (1, 2, 3)]
+    pitches = [{'at_bat_number': 40, 'pitch_number': 2}, {'at_bat_number': 12, 'pitch_number': 5}, None]
+    filenames, failures = get_vid.get_vids_parallel(urls, n_drivers = 2, use_selenium = False, pitches = pitches)
+    assert [read(f) if f else None for f in filenames] == [video_bytes('fast-pitch'), None, video_bytes('fast-pitch')]
+    assert [(i, url) for i, url, e in failures] == [(1, urls[1])]
+    assert '404' in str(failures[0][2])
+
+def test_clips_sharing_a_search_load_its_results_once(savant):
+    urls = [search_url(1)] * 2
+    pitches = [{'at_bat_number': 12, 'pitch_number': 5}, {'at_bat_number': 40, 'pitch_number': 2}]
+    filenames, failures = get_vid.get_vids_parallel(urls, n_drivers = 2, use_selenium = False, pitches = pitches)
+    assert failures == []
+    assert [read(f) for f in filenames] == [video_bytes('slow-pitch'), video_bytes('fast-pitch')]
+    assert len([path for path in savant.requests if 'type=details' in path]) == 1
+
+def test_each_worker_starts_one_driver_and_quits_it(savant):
+    savant.details = 'missing'
+    drivers = []
+
+    def make_driver():
+        drivers.append(FakeDriver(savant.base, requests.Session()))
+        return drivers[-1]
+
+    urls = [search_url(p) for p in range(1, 7)]
+    filenames, failures = get_vid.get_vids_parallel(urls, n_drivers = 2, make_driver = make_driver, poll = 0.01)
+    assert failures == []
+    assert all(read(f) == video_bytes('fast-pitch') for f in filenames)
+    assert 1 <= len(drivers) <= 2
+    assert [driver.quit_calls for driver in drivers] == [1] * len(drivers)
+    assert sum(driver.visited.count('/statcast_search') for driver in drivers) == len(urls)
+
+def test_clips_without_a_matching_result_fail_instead_of_using_selenium(savant):
+    drivers = []
+
+    def make_driver():
+        drivers.append(FakeDriver(savant.base, requests.Session()))
+        return drivers[-1]
+
+    urls = [search_url(1)]
+    filenames, failures = get_vid.get_vids_parallel(urls, make_driver = make_driver, poll = 0.01, pitches = [{'at_bat_number': 7, 'pitch_number': 1}])
+    assert filenames == [None]
+    assert [(i, url, type(e)) for i, url, e in failures] == [(0, urls[0], get_vid.NoMatchingPlay)]
+    assert drivers == []
+    driver = FakeDriver(savant.base, requests.Session())
+    with pytest.raises(get_vid.NoMatchingPlay):
+        get_vid.fetch_clip(urls[0], driver, pitch = {'at_bat_number': 7, 'pitch_number': 1})
+    assert driver.visited == []
+
+def test_clips_fail_without_a_driver_when_selenium_is_off(savant):
+    savant.details = 'missing'
+    urls = [search_url(1)]
+    filenames, failures = get_vid.get_vids_parallel(urls, make_driver = lambda: pytest.fail('no driver expected'), use_selenium = False)
+    assert filenames == [None]
+    assert [(i, url) for i, url, e in failures] == [(0, urls[0])]
+
+def test_play_ids_from_json_details(savant):
+    # Rows without a play id have no video
+    assert get_vid.resolve_play_ids(search_url(1)) == ['fast-pitch', 'slow-pitch']
+    assert [path for path in savant.requests if 'type=details' in path][0].endswith('&type=details&player_id=1')
+
+def test_play_ids_from_html_details(savant):
+    savant.details = 'html'
+    assert get_vid.resolve_play_ids(search_url(1)) == ['fast-pitch', 'slow-pitch']
+
+def test_video_source_home_and_away(savant):
+    assert get_vid.resolve_video_source('slow-pitch') == f'{savant.base}/video/slow-pitch.mp4'
+    assert get_vid.resolve_video_source('slow-pitch', away = True) == f'{savant.base}/video/slow-pitch-away.mp4'
+
+def test_resolve_source_url_matches_the_pitch(savant):
+    play_id, source_url = get_vid.resolve_source_url(search_url(1), pitch = {'at_bat_number': 12, 'pitch_number': 5})
+    assert (play_id, source_url) == ('slow-pitch', f'{savant.base}/video/slow-pitch.mp4')
+
+def test_session_is_shared_and_retries_server_errors(savant):
+    session = get_vid.get_session()
+    assert get_vid.get_session() is session
+    retries = session.get_adapter(savant.base).max_retries
+    assert retries.total == 3
+    assert {429, 500, 502, 503, 504} <= set(retries.status_forcelist)
+
+def test_http_lookup_falls_back_to_selenium(savant):
+    savant.details = 'missing'
+    driver = FakeDriver(savant.base, requests.Session())
+    timings = {}
+    filename = get_vid.get_vid_from_url(search_url(1), driver, away = True, poll = 0.01, timings = timings)
+    assert read(filename) == video_bytes('fast-pitch-away')
+    assert driver.visited == ['/statcast_search', '/sporty-videos', '/sporty-videos']
+    assert list(timings) == ['resolve', 'search', 'results', 'away', 'video', 'download']
+
+def test_http_lookup_failure_is_raised_without_a_driver(savant):
+    savant.details = 'missing'
+    with pytest.raises(requests.HTTPError):
+        get_vid.get_vid_from_url(search_url(1), None)
+
+def video_url(savant, name):
+    return f'{savant.base}/video/{name}.mp4'
+
+def test_dropped_downloads_resume_with_range(savant):
+    savant.drops = 2
+    get_vid.download_file(video_url(savant, 'clip'), 'clip.mp4', buffer_size = 1000)
+    assert read('clip.mp4') == video_bytes('clip')
+    assert [requested for requested, _ in savant.ranges] == [None, 'bytes=10000-', 'bytes=20000-']
+    assert all(validator is not None for _, validator in savant.ranges[1:])
+    assert not os.path.exists('clip.mp4.part') and not os.path.exists('clip.mp4.part.json')
+
+def test_stalled_downloads_resume_after_the_timeout(savant):
+    savant.stalls = 1
+    get_vid.download_file(video_url(savant, 'clip'), 'clip.mp4', timeout = 0.2, buffer_size = 1000)
+    assert read('clip.mp4') == video_bytes('clip')
+    assert [requested for requested, _ in savant.ranges] == [None, 'bytes=10000-']
+
+def test_part_file_of_another_url_is_discarded(savant):
+    savant.drops = 1
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        get_vid.download_file(video_url(savant, 'other'), 'clip.mp4', buffer_size = 1000, retries = 0)
+    assert os.path.getsize('clip.mp4.part') == 10_000
+    get_vid.download_file(video_url(savant, 'clip'), 'clip.mp4')
+    assert read('clip.mp4') == video_bytes('clip')
+    assert savant.ranges[-1] == (None, None)
+
+def test_part_file_without_a_sidecar_is_discarded(savant):
+    with open('clip.mp4.part', 'wb') as f:
+        f.write(b'left over')
+    get_vid.download_file(video_url(savant, 'clip'), 'clip.mp4')
+    assert read('clip.mp4') == video_bytes('clip')
+    assert savant.ranges == [(None, None)]
+
+def test_part_file_of_a_changed_video_is_downloaded_again(savant):
+    savant.drops = 1
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        get_vid.download_file(video_url(savant, 'clip'), 'clip.mp4', buffer_size = 1000, retries = 0)
+    savant.videos['clip'] = video_bytes('new clip')
+    get_vid.download_file(video_url(savant, 'clip'), 'clip.mp4')
+    assert read('clip.mp4') == video_bytes('new clip')
+    assert savant.ranges[-1][0] == 'bytes=10000-'
+
+def test_encoders_keep_going_when_a_clip_cannot_be_removed(savant, copy_encoder, monkeypatch):
+    import threading
+
+    def remove(path):
+        if path == 'highlight0.mp4':
+            raise PermissionError(path)
+        os.unlink(path)
+
+    monkeypatch.setattr(os, 'remove', remove)
+    urls = [search_url(p) for p in range(1, 6)]
+    output = {}
+    thread = threading.Thread(target = lambda: output.update(result = get_vid.render_pipelined(urls, n_drivers = 1, n_encoders = 1, queue_size = 1)),
+                              daemon = True)
+    thread.start()
+    thread.join(timeout = 20)
+    assert not thread.is_alive(), 'downloads blocked on the encoder queue'
+    segments, failures = output['result']
+    assert failures == []
+    assert [read(segment) for segment in segments] == [video_bytes('fast-pitch')] * len(urls)
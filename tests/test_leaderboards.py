@@ -0,0 +1,35 @@
+import pandas as pd
+import presets
+
+offseason = ('2022-10-20', '2023-01-10')
+
+def no_games(pybaseball, start_date, end_date):
+    pybaseball.no_games.update(d.strftime('%Y-%m-%d') for d in pd.date_range(start_date, end_date))
+
+def test_offseason_leaderboard_is_empty(pybaseball):
+    no_games(pybaseball, *offseason)
+    for chunk_days in (None, 7):
+        for daily in (False, True):
+            leaders = presets.make_leaderboard(*offseason, 5, 'walks', daily = daily, chunk_days = chunk_days)
+            assert len(leaders) == 0
+
+def test_chunks_without_games_are_skipped(pybaseball):
+    # Games end on 2022-10-25, so only the oldest chunk has data
+    no_games(pybaseball, '2022-10-26', offseason[1])
+    full = presets.make_leaderboard(*offseason, 5, 'walks')
+    streamed = presets.make_leaderboard(*offseason, 5, 'walks', chunk_days = 7)
+    assert len(full) == 5
+    pd.testing.assert_frame_equal(full, streamed, check_dtype = False, check_categorical = False)
+
+def test_offseason_shards_are_empty(pybaseball):
+    no_games(pybaseball, *offseason)
+    jobs = {'walks': (5, 'walks', False, [], [], False)}
+    rows, leaders = presets.shard_leaderboards(*offseason, jobs, formats = ['walks'])
+    assert (rows, len(leaders['walks'])) == (0, 0)
+
+def test_parallel_matches_serial_across_season_end(pybaseball):
+    no_games(pybaseball, '2022-10-26', offseason[1])
+    serial = presets.make_leaderboards(*offseason, 5)
+    parallel = presets.make_leaderboards(*offseason, 5, chunk_days = 7, n_workers = 2)
+    for key in serial:
+        pd.testing.assert_frame_equal(serial[key], parallel[key], check_dtype = False, check_categorical = False)
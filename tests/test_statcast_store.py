@@ -0,0 +1,58 @@
+import datetime
+import pandas as pd
+from statcast_store import StatcastStore
+from conftest import statcast_day
+
+def test_only_missing_days_are_fetched(tmp_path, pybaseball):
+    store = StatcastStore(str(tmp_path / 'store'))
+    store.write_day('2023-04-03', statcast_day('2023-04-03', seed = 20230403))
+    store.read('2023-04-01', '2023-04-05')
+    assert pybaseball.calls == [('2023-04-01', '2023-04-02'), ('2023-04-04', '2023-04-05')]
+    store.read('2023-04-01', '2023-04-05')
+    assert len(pybaseball.calls) == 2
+
+def test_days_that_were_not_final_are_fetched_again(tmp_path, pybaseball):
+    today = datetime.date.today()
+    start, end = (today - datetime.timedelta(days = 4)).isoformat(), (today - datetime.timedelta(days = 1)).isoformat()
+    store = StatcastStore(str(tmp_path / 'store'), settle_days = 2)
+    store.read(start, end)
+    assert [store.manifest[d.strftime('%Y-%m-%d')]['final'] for d in pd.date_range(start, end)] == [True, True, True, False]
+    pybaseball.calls.clear()
+    store.read(start, end)
+    assert pybaseball.calls == [(end, end)]
+
+def test_days_without_games_are_recorded_without_a_file(tmp_path, pybaseball):
+    pybaseball.no_games = {'2023-07-11'}
+    store = StatcastStore(str(tmp_path / 'store'))
+    df = store.read('2023-07-10', '2023-07-12')
+    assert store.manifest['2023-07-11']['rows'] == 0
+    assert store.manifest['2023-07-11']['hash'] is None
+    assert set(df['game_date'].dt.strftime('%Y-%m-%d')) == {'2023-07-10', '2023-07-12'}
+
+def test_manifest_and_parquet_round_trip(tmp_path, pybaseball):
+    path = str(tmp_path / 'store')
+    df = StatcastStore(path).read('2023-04-01', '2023-04-03')
+    expected = pybaseball.statcast('2023-04-01', '2023-04-03')
+    pd.testing.assert_frame_equal(df, expected, check_dtype = False)
+    reopened = StatcastStore(path)
+    assert reopened.manifest == StatcastStore(path).load_manifest()
+    assert reopened.manifest['2023-04-02']['rows'] == 20
+    pybaseball.calls.clear()
+    again = reopened.read('2023-04-01', '2023-04-03', columns = ['game_date', 'batter'])
+    assert pybaseball.calls == []
+    pd.testing.assert_frame_equal(again, expected[['game_date', 'batter']], check_dtype = False)
+
+def test_days_stored_with_different_integer_widths_read_together(tmp_path, pybaseball):
+    # pybaseball downcasts each pull on its own, so one column can be Int8 on one day and Int16 or float on another
+    store = StatcastStore(str(tmp_path / 'store'))
+    first, second = statcast_day('2023-04-01', seed = 1), statcast_day('2023-04-02', seed = 2)
+    first['at_bat_number'] = first['at_bat_number'].astype('Int8')
+    second['at_bat_number'] = (second['at_bat_number'] + 200).astype('Int16')
+    first['pitcher_days_since_prev_game'] = pd.array([None] + [4] * (len(first) - 1), dtype = 'Int8')
+    second['pitcher_days_since_prev_game'] = 120.0
+    store.write_day('2023-04-01', first)
+    store.write_day('2023-04-02', second)
+    df = store.read('2023-04-01', '2023-04-02', fetch = False)
+    assert list(df['at_bat_number']) == list(second['at_bat_number']) + list(first['at_bat_number'])
+    assert df['pitcher_days_since_prev_game'].isna().sum() == 1
+    assert df['pitcher_days_since_prev_game'].max() == 120